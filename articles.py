@@ -0,0 +1,82 @@
+"""Компактное представление статей: неизменяемые записи и сжатое хранилище текстов."""
+from typing import Optional, List
+import threading
+import sqlite3
+import sys
+import time
+import zlib
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS article_content (
+    url TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS article_content_stored_at ON article_content(stored_at);
+"""
+
+
+class ArticleStore:
+    """Тексты статей, сжатые zlib, в локальной SQLite; в памяти их не держим."""
+
+    def __init__(self, path: str, limit: int):
+        self.path = path
+        self.limit = limit  # Сколько последних статей хранить
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def save(self, url: str, content: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO article_content(url, content, stored_at) VALUES (?, ?, ?)",
+                (url, zlib.compress(content.encode("utf-8")), time.time())
+            )
+
+    def load(self, url: str) -> str:
+        with self.lock:
+            row = self.conn.execute("SELECT content FROM article_content WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else ""
+
+    def load_many(self, urls: List[str]) -> List[str]:
+        """Тексты нескольких статей одним запросом, в порядке urls"""
+        if not urls:
+            return []
+        with self.lock:
+            rows = dict(self.conn.execute(
+                f"SELECT url, content FROM article_content WHERE url IN ({','.join('?' * len(urls))})", urls
+            ).fetchall())
+        return [zlib.decompress(rows[u]).decode("utf-8") if u in rows else "" for u in urls]
+
+    def prune(self) -> int:
+        """Удаляет самые старые тексты сверх limit"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM article_content WHERE url NOT IN "
+                "(SELECT url FROM article_content ORDER BY stored_at DESC LIMIT ?)",
+                (self.limit,)
+            )
+            return cursor.rowcount
+
+
+class Article:
+    """Неизменяемая запись о статье; текст загружается из ArticleStore по требованию"""
+
+    __slots__ = ("url", "title", "covered_by", "store")
+
+    def __init__(self, url: str, title: str, store: ArticleStore, covered_by: Optional[int] = None):
+        # URL повторяются между прогонами, в индексе и в БД — храним одну копию строки
+        object.__setattr__(self, "url", sys.intern(url))
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "covered_by", covered_by)
+        object.__setattr__(self, "store", store)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Article is immutable: cannot set {name}")
+
+    def __repr__(self):
+        return f"Article(url={self.url!r}, title={self.title!r}, covered_by={self.covered_by!r})"
+
+    @property
+    def content(self) -> str:
+        return self.store.load(self.url)
@@ -0,0 +1,177 @@
+"""Проверки: оптимизированные компоненты ведут себя так же, как прежний код.
+
+Бенчмарки измеряют скорость, а эти проверки — что ускорение ничего не сломало.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.checks
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from fetcher import CircuitBreaker, HostPolicy, read_entry_content
+from search_index import SearchIndex
+from singleflight import SingleFlight
+
+FIXTURE = Path(__file__).parent / "fixtures" / "article.html"
+
+# Вложенные div, сущности, абзацы без класса, второй entry-content, многобайтовые символы и обрыв
+EDGE_CASES = [
+    '<html><body><div class="entry-content">'
+    '<p class="wp-block-paragraph">A &amp; B <a href="#">ссылка</a> &#8212; C</p>'
+    '<div class="ad"><p class="wp-block-paragraph">вложенный</p></div>'
+    '<p>без класса</p>'
+    '<p class="has-text wp-block-paragraph">Ёж — «ёлка» 🚀</p>'
+    '</div><div class="entry-content"><p class="wp-block-paragraph">второй</p></div>'
+    '</body></html>',
+    '<html><body><div class="post"><p class="wp-block-paragraph">нет entry-content</p></div></body></html>',
+    # Страница оборвана до закрытия entry-content (лимит байт или разрыв соединения)
+    '<html><body><div class="entry-content"><p class="wp-block-paragraph">первый</p>'
+    '<p class="wp-block-paragraph">A &amp; B &#8212; Q&A: хвост &',
+]
+
+
+class _Content:
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def iter_chunked(self, _):
+        for i in range(0, len(self.body), self.chunk_size):
+            yield self.body[i:i + self.chunk_size]
+
+
+class _Response:
+    """Минимум aiohttp.ClientResponse, который нужен читателям fetcher"""
+
+    charset = "utf-8"
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self.content = _Content(body, chunk_size)
+
+
+def soup_text(html: str) -> str:
+    """Прежнее извлечение текста статьи через BeautifulSoup"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    content = soup.find("div", class_="entry-content")
+    paragraphs = content.find_all("p", class_="wp-block-paragraph") if content else []
+    return "\n".join(p.get_text() for p in paragraphs)
+
+
+def check_entry_content():
+    """Потоковый EntryContentParser совпадает с BeautifulSoup при любом размере чанков"""
+    for html in [FIXTURE.read_text(encoding="utf-8")] + EDGE_CASES:
+        expected = soup_text(html)
+        body = html.encode("utf-8")
+        for chunk_size in (1, 7, 100, 16 * 1024):
+            text, _ = asyncio.run(read_entry_content(_Response(body, chunk_size), max_bytes=len(body)))
+            assert text == expected, f"EntryContentParser, чанки по {chunk_size} байт: {text!r} != {expected!r}"
+
+
+def check_circuit_breaker():
+    """Размыкание после серии ошибок, одна проба после паузы, замыкание после успеха"""
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN and breaker.allow()
+    # Неудачная проба снова размыкает без новой серии ошибок
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def check_host_policy():
+    """Таймауты поднимают таймаут хоста, виды запросов не влияют друг на друга"""
+    policy = HostPolicy(max_timeout=10, min_timeout=0.5, min_samples=5, timeout_factor=3,
+                        failure_threshold=3, cooldown=0.05)
+    assert policy.timeout("page") == 10 and policy.hedge_after("page") is None
+
+    for _ in range(5):
+        policy.record("page", 0.1)
+    assert policy.timeout("page") == 0.5 and policy.hedge_after("page") == 0.1
+    assert policy.timeout("article") == 10, "статистика страниц не должна задавать таймаут статей"
+
+    # Цензурированные выборки: хост стал медленнее текущего таймаута
+    for _ in range(5):
+        policy.record("page", policy.timeout("page"))
+    assert policy.timeout("page") > 0.5
+
+    for _ in range(3):
+        policy.breaker.record_failure()
+    time.sleep(0.06)
+    assert policy.timeout("page") == 10 and policy.hedge_after("page") is None, "проба идет с максимальным таймаутом"
+
+
+def check_single_flight():
+    """Одновременные вызовы делят одно выполнение; force_new запускает новое после текущего"""
+    async def scenario():
+        flight = SingleFlight()
+        log = []
+
+        async def work(name):
+            log.append(f"start {name}")
+            await asyncio.sleep(0.02)
+            log.append(f"end {name}")
+            return name
+
+        first = asyncio.create_task(flight.do("post", lambda: work("a")))
+        await asyncio.sleep(0)
+        assert flight.joins("post") and not flight.joins("post", force_new=True)
+        joined = asyncio.create_task(flight.do("post", lambda: work("b")))
+        fresh = asyncio.create_task(flight.do("post", lambda: work("c"), force_new=True))
+        cancelled = asyncio.create_task(flight.do("post", lambda: work("d"), force_new=True))
+        await asyncio.sleep(0)
+        # Отмена одного из ожидающих не отменяет общее выполнение
+        cancelled.cancel()
+
+        assert await first == "a" and await joined == "a" and await fresh == "c"
+        assert log == ["start a", "end a", "start c", "end c"], log
+        assert not flight.joins("post"), "ключ освобождается после завершения"
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flight.do("post", fail), flight.do("post", fail), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results) and not flight.joins("post")
+
+    asyncio.run(scenario())
+
+
+def check_search_index():
+    """Уже освещенные статьи находятся по ссылке и теме, а общие слова темы не совпадают"""
+    index = SearchIndex(":memory:")
+    index.rebuild([{
+        "id": 1, "telegram_id": 10, "is_post": True, "message_text": "Главное за день",
+        "url": json.dumps([
+            "https://techcrunch.com/2026/10/18/fintech-startup-ramp-raises-500m-from-founders-fund/",
+            "https://techcrunch.com/2026/10/18/openai-launches-a-new-model-with-better-reasoning/",
+        ]),
+    }])
+
+    assert index.find_covered("https://techcrunch.com/2026/10/18/fintech-startup-ramp-raises-500m-from-founders-fund/", "") == 1
+    for title in ("Ramp raises $500M from Founders Fund", "OpenAI launches new model with better reasoning"):
+        assert index.find_covered("https://techcrunch.com/new/", title) == 1, title
+    for title in ("Lovable raises $200M from Accel", "Robotics startup Figure raises $1B",
+                  "Meta launches new model with video", "Apple launches Vision Pro with M5"):
+        assert index.find_covered("https://techcrunch.com/new/", title) is None, f"ложное совпадение: {title}"
+
+
+CHECKS = [check_entry_content, check_circuit_breaker, check_host_policy, check_single_flight, check_search_index]
+
+
+if __name__ == "__main__":
+    for check in CHECKS:
+        check()
+        print(f"{check.__name__}: OK")
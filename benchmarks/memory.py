@@ -0,0 +1,117 @@
+"""Бенчмарк памяти: установившийся RSS на 1000 статей.
+
+Сравнивает прежнее представление (dict с полным текстом) и Article с текстом
+в сжатом ArticleStore. Каждый вариант измеряется в отдельном интерпретаторе.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.memory --articles 5000
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from fetcher import EntryContentParser
+
+FIXTURE = Path(__file__).parent / "fixtures" / "article.html"
+MODES = ("dict", "article")
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def article_text() -> str:
+    parser = EntryContentParser()
+    parser.feed(FIXTURE.read_text(encoding="utf-8"))
+    return parser.text()
+
+
+def build(mode: str, count: int, text: str, store_path: str):
+    if mode == "dict":
+        return [
+            {
+                "url": f"https://techcrunch.com/2026/10/19/article-{i}/",
+                "title": f"Article {i}: startup raises a new round",
+                # Каждая статья — отдельная строка, как после разбора страницы
+                "content": f"{i}\n{text}",
+            }
+            for i in range(count)
+        ]
+
+    from articles import Article, ArticleStore
+
+    store = ArticleStore(store_path, limit=count)
+    records = []
+    for i in range(count):
+        url = f"https://techcrunch.com/2026/10/19/article-{i}/"
+        store.save(url, f"{i}\n{text}")
+        records.append(Article(url, f"Article {i}: startup raises a new round", store))
+    return records
+
+
+def measure(mode: str, count: int) -> dict:
+    text = article_text()
+    with tempfile.TemporaryDirectory() as tmp:
+        gc.collect()
+        rss_before = rss_bytes()
+        tracemalloc.start()
+
+        records = build(mode, count, text, str(Path(tmp) / "articles.sqlite3"))
+        gc.collect()
+
+        traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = rss_bytes()
+        assert len(records) == count
+
+    return {
+        "mode": mode,
+        "articles": count,
+        "rss_per_1000_kb": (rss_after - rss_before) / count * 1000 / 1024,
+        "traced_per_1000_kb": traced / count * 1000 / 1024,
+    }
+
+
+def run(count: int) -> list:
+    results = []
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.memory", "--measure", mode, "--articles", str(count)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output))
+    return results
+
+
+def print_report(results: list):
+    for r in results:
+        print(f"{r['mode']:>8}: RSS {r['rss_per_1000_kb']:9.1f} КБ / 1000 статей, "
+              f"tracemalloc {r['traced_per_1000_kb']:9.1f} КБ / 1000 статей")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--measure", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.articles)))
+    else:
+        results = run(args.articles)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_report(results)
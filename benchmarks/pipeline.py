@@ -0,0 +1,223 @@
+"""Сквозной офлайн-бенчмарк: generate_daily_post + approve_post.
+
+Поднимает заглушки из ``benchmarks.stubs`` отдельным процессом, подменяет
+``config`` и клиентов бота так, чтобы все запросы шли на localhost, и
+печатает пропускную способность, p50/p95 задержки и пиковую память.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.pipeline --runs 20 --mistral-latency 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+from datetime import datetime
+
+BOT_TOKEN = "123456:BENCHMARK-token"
+ADMINS = ["1001", "1002"]
+CHANNEL_ID = -1001
+# Supabase проверяет, что ключ похож на JWT
+SUPABASE_KEY = "bench.bench.bench"
+
+
+def install_config(urls: dict):
+    """Регистрирует модуль config, указывающий на локальные заглушки"""
+    config = types.ModuleType("config")
+    config.BOT_TOKEN = BOT_TOKEN
+    config.MISTRAL_API_KEY = "bench"
+    config.ADMINS = ADMINS
+    config.TECHCRUNCH_URL = urls["techcrunch"] + "/"
+    config.COLLECTION_TIME = "19:00"
+    config.POSTING_TIME = "20:00"
+    config.CHANNEL_ID = CHANNEL_ID
+    config.SUPABASE_URL = urls["postgrest"]
+    config.SUPABASE_KEY = SUPABASE_KEY
+    sys.modules["config"] = config
+
+
+def load_main(urls: dict):
+    """Импортирует main и перенаправляет клиентов Mistral и Telegram на заглушки"""
+    install_config(urls)
+
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from mistralai import Mistral
+
+    import main
+
+    # Индекс и хранилище статей только в памяти, чтобы бенчмарк не оставлял файлов
+    main.SEARCH_INDEX_PATH = ":memory:"
+    main.ARTICLE_STORE_PATH = ":memory:"
+    main.mistral_client = Mistral(api_key="bench", server_url=urls["mistral"])
+    main.bot = Bot(
+        token=BOT_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(urls["telegram"]))
+    )
+    return main
+
+
+def make_admin_message(main):
+    """Сообщение «✅ Опубликовать» от администратора"""
+    from aiogram import types as tg
+
+    admin_id = int(ADMINS[0])
+    message = tg.Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=tg.Chat(id=admin_id, type="private"),
+        from_user=tg.User(id=admin_id, is_bot=False, first_name="Bench"),
+        text="✅ Опубликовать",
+    )
+    return message.as_(main.bot)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def wait_background(main):
+    """Дожидается фоновых задач, запущенных approve_post"""
+    while getattr(main, "background_tasks", None):
+        await asyncio.gather(*main.background_tasks, return_exceptions=True)
+
+
+def traced(main, trace_file):
+    """Прогон под трассировкой, если задан --trace-file"""
+    if not trace_file:
+        return contextlib.nullcontext()
+    main.TRACE_FILE = trace_file
+    return main.trace_generation("benchmark")
+
+
+async def start_stubs(args):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.stubs",
+        "--techcrunch-latency", str(args.techcrunch_latency),
+        "--mistral-latency", str(args.mistral_latency),
+        "--telegram-latency", str(args.telegram_latency),
+        "--postgrest-latency", str(args.postgrest_latency),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    line = await asyncio.wait_for(process.stdout.readline(), timeout=30)
+    if not line:
+        raise RuntimeError("Заглушки не запустились")
+    return process, json.loads(line)
+
+
+async def start_polling(main):
+    """Диспетчер бота получает автопересылки постов в чат комментариев, как в боевом режиме"""
+    _, dp = main.create_app()
+    await main.get_linked_chat_id()
+    task = asyncio.create_task(dp.start_polling(main.bot, polling_timeout=1, handle_signals=False,
+                                                close_bot_session=False))
+    return dp, task
+
+
+async def run(args):
+    process, urls = await start_stubs(args)
+    try:
+        main = load_main(urls)
+        logging.getLogger().setLevel(args.log_level)
+        message = make_admin_message(main)
+        dp, polling = await start_polling(main)
+
+        # Прогрев: соединения, импорты, кеши парсера
+        for _ in range(args.warmup):
+            main.pending_post = await main.generate_daily_post()
+            await main.approve_post(message)
+            await wait_background(main)
+
+        generate_times, approve_times, publish_times, total_times = [], [], [], []
+        tracemalloc.start()
+        started = time.perf_counter()
+
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            async with traced(main, args.trace_file):
+                # Несколько одновременных запросов генерации (планировщик + админы)
+                posts = await asyncio.gather(*(main.generate_daily_post() for _ in range(args.concurrency)))
+                main.pending_post = posts[0]
+            t1 = time.perf_counter()
+            await main.approve_post(message)
+            t2 = time.perf_counter()
+            # Фоновые шаги публикации: чат комментариев, БД, уведомления
+            await wait_background(main)
+            t3 = time.perf_counter()
+
+            generate_times.append(t1 - t0)
+            approve_times.append(t2 - t1)
+            publish_times.append(t3 - t1)
+            total_times.append(t3 - t0)
+
+        elapsed = time.perf_counter() - started
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await dp.stop_polling()
+        await polling
+        await main.bot.session.close()
+    finally:
+        process.terminate()
+        await process.wait()
+
+    report = {
+        "runs": args.runs,
+        "elapsed_s": elapsed,
+        "throughput_runs_per_s": args.runs / elapsed if elapsed else 0.0,
+        "peak_traced_mb": traced_peak / 2**20,
+        # ru_maxrss в Linux измеряется в килобайтах
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    for name, values in (("generate", generate_times), ("approve", approve_times),
+                         ("publish", publish_times), ("total", total_times)):
+        report[f"{name}_p50_ms"] = percentile(values, 50) * 1000
+        report[f"{name}_p95_ms"] = percentile(values, 95) * 1000
+        report[f"{name}_mean_ms"] = statistics.fmean(values) * 1000 if values else 0.0
+    return report
+
+
+def print_report(report: dict):
+    print(f"Прогонов: {report['runs']} за {report['elapsed_s']:.2f} с "
+          f"({report['throughput_runs_per_s']:.2f} прогонов/с)")
+    for name in ("generate", "approve", "publish", "total"):
+        print(f"{name:>9}: p50 {report[f'{name}_p50_ms']:8.1f} мс  "
+              f"p95 {report[f'{name}_p95_ms']:8.1f} мс  "
+              f"среднее {report[f'{name}_mean_ms']:8.1f} мс")
+    print(f"Пик памяти: tracemalloc {report['peak_traced_mb']:.1f} МБ, RSS {report['peak_rss_mb']:.1f} МБ")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--techcrunch-latency", type=float, default=0.02)
+    parser.add_argument("--mistral-latency", type=float, default=0.3)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--postgrest-latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="одновременных вызовов generate_daily_post в каждом прогоне")
+    parser.add_argument("--trace-file", help="писать трассы прогонов в этот JSONL-файл")
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
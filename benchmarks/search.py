@@ -0,0 +1,116 @@
+"""Бенчмарк локального поискового индекса на синтетическом архиве messages.
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.search --messages 100000
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from search_index import SearchIndex
+
+SYLLABLES = "ка ло ми не ро та су фи ве ды жу зо ин ак ор ун эс пра сто кри".split()
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    return ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 5))) for _ in range(size)]
+
+
+# Частоты слов в текстах близки к закону Ципфа
+VOCABULARY = make_vocabulary(30000, random.Random(0))
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+WORDS = VOCABULARY[:2000]  # Слова запросов: достаточно частые, чтобы находиться
+
+
+def make_url(rng: random.Random) -> str:
+    """Адрес в стиле TechCrunch: slug из слов заголовка"""
+    return f"https://techcrunch.com/2026/10/19/{'-'.join(rng.choices(VOCABULARY, WEIGHTS, k=7))}/"
+
+
+def make_message(message_id: int, rng: random.Random) -> dict:
+    is_post = message_id % 10 == 0
+    return {
+        "id": message_id,
+        "telegram_id": message_id * 3,
+        "message_text": " ".join(rng.choices(VOCABULARY, WEIGHTS, k=120 if is_post else 20)),
+        "url": json.dumps([make_url(rng) for _ in range(3)]) if is_post else None,
+        "is_post": is_post,
+    }
+
+
+def timed(fn, *args, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    ordered = sorted(samples)
+    return statistics.median(ordered) * 1000, ordered[int(0.95 * (len(ordered) - 1))] * 1000
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    messages = [make_message(i, rng) for i in range(1, args.messages + 1)]
+    post_urls = [json.loads(m["url"]) for m in messages if m["is_post"]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(str(Path(tmp) / "index.sqlite3"))
+
+        started = time.perf_counter()
+        index.rebuild(messages)
+        rebuild_s = time.perf_counter() - started
+
+        next_id = args.messages + 1
+        started = time.perf_counter()
+        for i in range(args.queries):
+            index.add(make_message(next_id + i, rng))
+        add_ms = (time.perf_counter() - started) / args.queries * 1000
+
+        search_p50, search_p95 = timed(lambda: index.search(" ".join(rng.sample(WORDS, 2))), repeat=args.queries)
+        url_p50, url_p95 = timed(
+            lambda: index.find_covered(rng.choice(rng.choice(post_urls)), "x"),
+            repeat=args.queries
+        )
+        topic_p50, topic_p95 = timed(
+            lambda: index.find_covered("https://example.com/new", " ".join(rng.sample(WORDS, 6))),
+            repeat=args.queries
+        )
+
+    return {
+        "messages": args.messages,
+        "rebuild_s": rebuild_s,
+        "add_mean_ms": add_ms,
+        "search_p50_ms": search_p50, "search_p95_ms": search_p95,
+        "covered_url_p50_ms": url_p50, "covered_url_p95_ms": url_p95,
+        "covered_topic_p50_ms": topic_p50, "covered_topic_p95_ms": topic_p95,
+    }
+
+
+def print_report(report: dict):
+    print(f"Сообщений: {report['messages']}, перестройка {report['rebuild_s']:.2f} с, "
+          f"добавление {report['add_mean_ms']:.2f} мс")
+    for name, label in (("search", "/search"), ("covered_url", "по ссылке"), ("covered_topic", "по теме")):
+        print(f"{label:>10}: p50 {report[f'{name}_p50_ms']:6.2f} мс  p95 {report[f'{name}_p95_ms']:6.2f} мс")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,80 @@
+"""Бенчмарк холодного старта main.py.
+
+Каждое измерение — новый интерпретатор: время ``import main`` (то, что платит
+тест ради ``is_admin``) и время до готовности к polling (``create_app``).
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.startup --repeat 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("aiogram", "aiohttp", "bs4", "mistralai", "supabase")
+
+PROBE = """
+import json, sys, time
+from benchmarks.pipeline import install_config
+install_config({"techcrunch": "http://127.0.0.1", "postgrest": "http://127.0.0.1"})
+
+started = time.perf_counter()
+import main
+main.is_admin("0")
+imported = time.perf_counter()
+loaded = [m for m in %(heavy)r if m in sys.modules]
+main.create_app()
+ready = time.perf_counter()
+
+print(json.dumps({
+    "import_s": imported - started,
+    "create_app_s": ready - imported,
+    "ready_s": ready - started,
+    "heavy_modules_on_import": loaded,
+}))
+""" % {"heavy": HEAVY_MODULES}
+
+
+def probe() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int) -> dict:
+    samples = [probe() for _ in range(repeat)]
+    report = {"repeat": repeat, "heavy_modules_on_import": samples[-1]["heavy_modules_on_import"]}
+    for key in ("import_s", "create_app_s", "ready_s"):
+        values = [s[key] for s in samples]
+        report[f"{key[:-2]}_median_ms"] = statistics.median(values) * 1000
+        report[f"{key[:-2]}_max_ms"] = max(values) * 1000
+    return report
+
+
+def print_report(report: dict):
+    print(f"Запусков: {report['repeat']}")
+    for name, label in (("import", "import main"), ("create_app", "create_app()"), ("ready", "до polling")):
+        print(f"{label:>13}: медиана {report[f'{name}_median_ms']:8.1f} мс  "
+              f"максимум {report[f'{name}_max_ms']:8.1f} мс")
+    heavy = ", ".join(report["heavy_modules_on_import"]) or "нет"
+    print(f"Тяжелые модули после import main: {heavy}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
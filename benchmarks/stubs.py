@@ -0,0 +1,218 @@
+"""Локальные заглушки TechCrunch, Mistral, Telegram Bot API и PostgREST для бенчмарков.
+
+Запускается отдельным процессом: ``python -m benchmarks.stubs``. После старта
+печатает в stdout одну строку JSON с адресами всех серверов и работает,
+пока процесс не будет остановлен.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from aiohttp import web
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+async def _delay(seconds: float):
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+def techcrunch_app(latency: float) -> web.Application:
+    """Отдает записанные HTML-фикстуры ленты и статей"""
+    listing = (FIXTURES_DIR / "listing.html").read_text(encoding="utf-8")
+    article = (FIXTURES_DIR / "article.html").read_text(encoding="utf-8").encode("utf-8")
+
+    async def get_listing(request: web.Request):
+        await _delay(latency)
+        base_url = f"{request.scheme}://{request.host}"
+        # Статьи должны попадать в окно последних 20 часов
+        published = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        body = listing.replace("{base_url}", base_url).replace("{published}", published)
+        return web.Response(text=body, content_type="text/html")
+
+    async def get_article(request: web.Request):
+        await _delay(latency)
+        return web.Response(body=article, content_type="text/html", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/", get_listing)
+    app.router.add_get("/article/{slug}", get_article)
+    return app
+
+
+def mistral_app(latency: float) -> web.Application:
+    """Имитирует /v1/chat/completions с настраиваемой задержкой"""
+    counter = itertools.count(1)
+
+    async def chat_completions(request: web.Request):
+        payload = await request.json()
+        await _delay(latency)
+
+        if (payload.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps({"selected": [0, 1, 2], "reason": "benchmark"})
+        else:
+            content = "🚀 Главное за день\n\n" + "Короткая выжимка новостей из мира технологий. " * 8
+
+        return web.json_response({
+            "id": f"cmpl-{next(counter)}",
+            "object": "chat.completion",
+            "model": payload.get("model", "mistral-large-latest"),
+            "created": int(time.time()),
+            "usage": {"prompt_tokens": 100, "completion_tokens": 100, "total_tokens": 200},
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+def telegram_app(latency: float, linked_chat_id: int) -> web.Application:
+    """Имитирует методы Bot API, которые вызывает бот"""
+    message_ids = itertools.count(1)
+    update_ids = itertools.count(1)
+    # Автопересылки постов канала в чат комментариев, которые вернет getUpdates
+    updates = []
+    new_update = asyncio.Event()
+
+    def forward_to_discussion(message):
+        if message["chat"]["type"] != "channel":
+            return
+        copy = dict(message, message_id=next(message_ids), is_automatic_forward=True)
+        copy["chat"] = {"id": linked_chat_id, "type": "supergroup"}
+        copy["sender_chat"] = message["chat"]
+        copy["from"] = {"id": 777000, "is_bot": False, "first_name": "Telegram"}
+        updates.append({"update_id": next(update_ids), "message": copy})
+        new_update.set()
+
+    async def get_updates(offset: int, limit: int, timeout: float):
+        """Long polling: ждет новых обновлений не дольше timeout"""
+        updates[:] = [u for u in updates if u["update_id"] >= offset]
+        if not updates and timeout > 0:
+            new_update.clear()
+            try:
+                await asyncio.wait_for(new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return updates[:limit]
+
+    def make_message(chat_id, text=None, caption=None, media_group_id=None):
+        message = {
+            "message_id": next(message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "channel" if str(chat_id).startswith("-") else "private"},
+        }
+        if text is not None:
+            message["text"] = text
+        if caption is not None:
+            message["caption"] = caption
+        if media_group_id is not None:
+            message["media_group_id"] = media_group_id
+            message["photo"] = [{"file_id": "bench", "file_unique_id": "bench", "width": 1, "height": 1}]
+        return message
+
+    async def call_method(request: web.Request):
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        await _delay(latency)
+
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "getChat":
+            result = {
+                "id": int(data["chat_id"]), "type": "channel", "title": "Bench",
+                "linked_chat_id": linked_chat_id, "accent_color_id": 0, "max_reaction_count": 11,
+            }
+        elif method == "sendMessage":
+            result = make_message(data["chat_id"], text=data.get("text", ""))
+            forward_to_discussion(result)
+        elif method == "sendMediaGroup":
+            media = json.loads(data["media"])
+            group_id = str(next(message_ids))
+            result = [
+                make_message(data["chat_id"], caption=m.get("caption"), media_group_id=group_id)
+                for m in media
+            ]
+            for message in result:
+                forward_to_discussion(message)
+        elif method == "getUpdates":
+            result = await get_updates(
+                int(data.get("offset", 0)), int(data.get("limit", 100)), float(data.get("timeout", 0))
+            )
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", call_method)
+    return app
+
+
+def postgrest_app(latency: float) -> web.Application:
+    """Имитирует таблицу messages в PostgREST"""
+    ids = itertools.count(1)
+
+    async def insert(request: web.Request):
+        rows = await request.json()
+        await _delay(latency)
+        if isinstance(rows, dict):
+            rows = [rows]
+        return web.json_response([{"id": next(ids), **row} for row in rows], status=201)
+
+    async def select(request: web.Request):
+        await _delay(latency)
+        return web.json_response([])
+
+    app = web.Application()
+    app.router.add_post("/rest/v1/{table}", insert)
+    app.router.add_get("/rest/v1/{table}", select)
+    return app
+
+
+async def start_app(app: web.Application, host: str) -> str:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return f"http://{host}:{port}"
+
+
+async def serve(args):
+    urls = {
+        "techcrunch": await start_app(techcrunch_app(args.techcrunch_latency), args.host),
+        "mistral": await start_app(mistral_app(args.mistral_latency), args.host),
+        "telegram": await start_app(telegram_app(args.telegram_latency, args.linked_chat_id), args.host),
+        "postgrest": await start_app(postgrest_app(args.postgrest_latency), args.host),
+    }
+    print(json.dumps(urls), flush=True)
+    await asyncio.Event().wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--techcrunch-latency", type=float, default=0.02)
+    parser.add_argument("--mistral-latency", type=float, default=0.3)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--postgrest-latency", type=float, default=0.05)
+    parser.add_argument("--linked-chat-id", type=int, default=-1002)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(0)
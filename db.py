@@ -2,6 +2,7 @@ from config import (
     SUPABASE_URL, SUPABASE_KEY
 )
 from typing import Optional, Dict, List
+import asyncio
 from supabase import create_client, Client
 from supabase.client import ClientOptions
 from supabase import PostgrestAPIError
@@ -10,8 +11,12 @@ from supabase import PostgrestAPIError
 class Database:
     """Класс для работы с сообщениями Telegram-бота в Supabase."""
     
-    def __init__(self):
-        """Инициализация подключения к Supabase."""
+    def __init__(self, search_index=None):
+        """Инициализация подключения к Supabase.
+        
+        Если передан search_index (SearchIndex), вставленные и обновленные
+        сообщения сразу добавляются в локальный поисковый индекс.
+        """
         supabase_url = SUPABASE_URL
         supabase_key = SUPABASE_KEY
         
@@ -24,6 +29,20 @@ class Database:
             options=ClientOptions(postgrest_client_timeout=10)
         )
         self.table_name = "messages"
+        self.search_index = search_index
+    
+    async def _execute(self, query):
+        """Выполняет запрос синхронного клиента Supabase в потоке, не блокируя цикл событий."""
+        return await asyncio.to_thread(query.execute)
+    
+    async def _index(self, row: Optional[Dict]):
+        """Добавляет запись в локальный поисковый индекс в потоке, если он подключен."""
+        if self.search_index is None or not row:
+            return
+        try:
+            await asyncio.to_thread(self.search_index.add, row)
+        except Exception as e:
+            print(f"Search index error: {e}")
     
     async def insert_post(
         self,
@@ -48,16 +67,17 @@ class Database:
             # Удаляем None значения
             post_data = {k: v for k, v in post_data.items() if v is not None}
             
-            response = (
+            query = (
                 self.client
                 .table(self.table_name)
                 .insert(post_data)
-                .execute()
             )
+            response = await self._execute(query)
             
             if not response.data:
                 return None
                 
+            await self._index(response.data[0])
             return response.data[0]
             
         except PostgrestAPIError as e:  # Используем новое имя исключения
@@ -92,16 +112,17 @@ class Database:
             # Удаляем None значения
             message_data = {k: v for k, v in message_data.items() if v is not None}
             
-            response = (
+            query = (
                 self.client
                 .table(self.table_name)
                 .insert(message_data)
-                .execute()
             )
+            response = await self._execute(query)
             
             if not response.data:
                 return None
                 
+            await self._index(response.data[0])
             return response.data[0]
             
         except PostgrestAPIError as e:
@@ -114,13 +135,13 @@ class Database:
     async def get_message_by_id(self, id: int) -> Optional[Dict]:
         """Получает сообщение по его ID."""
         try:
-            response = (
+            query = (
                 self.client
                 .table(self.table_name)
                 .select("*")
                 .eq("id", id)
-                .execute()
             )
+            response = await self._execute(query)
             return response.data[0] if response.data else None
         except PostgrestAPIError as e:
             print(f"Database error: {e}")
@@ -129,13 +150,13 @@ class Database:
     async def get_replies_by_parent_id(self, parent_id: int) -> List[Dict]:
         """Получает все ответы на указанное сообщение."""
         try:
-            response = (
+            query = (
                 self.client
                 .table(self.table_name)
                 .select("*")
                 .eq("parent_id", parent_id)
-                .execute()
             )
+            response = await self._execute(query)
             return response.data if response.data else []
         except PostgrestAPIError as e:
             print(f"Database error: {e}")
@@ -150,19 +171,45 @@ class Database:
             if not fields:
                 raise ValueError("No fields to update provided")
                 
-            response = (
+            query = (
                 self.client
                 .table(self.table_name)
                 .update(fields)
                 .eq("id", id)
-                .execute()
             )
-            return response.data[0] if response.data else None
+            response = await self._execute(query)
+            if not response.data:
+                return None
+            
+            await self._index(response.data[0])
+            return response.data[0]
         except PostgrestAPIError as e:
             print(f"Database error: {e}")
             return None
         except ValueError as e:
             print(f"Validation error: {e}")
             return None
-
     
+    async def get_all_messages(self, batch_size: int = 1000) -> Optional[List[Dict]]:
+        """Выгружает все сообщения постранично (для перестройки поискового индекса)."""
+        messages = []
+        try:
+            while True:
+                query = (
+                    self.client
+                    .table(self.table_name)
+                    .select("id, telegram_id, message_text, url, is_post, parent_id")
+                    .order("id")
+                    .range(len(messages), len(messages) + batch_size - 1)
+                )
+                response = await self._execute(query)
+                messages.extend(response.data or [])
+                if len(response.data or []) < batch_size:
+                    return messages
+        except PostgrestAPIError as e:
+            print(f"Database error: {e}")
+            return None
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return None
+
@@ -0,0 +1,292 @@
+"""Загрузка страниц: адаптивные таймауты по хостам, хеджирование, circuit breaker
+и потоковое извлечение текста статьи."""
+from __future__ import annotations
+
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable, TYPE_CHECKING
+from collections import deque
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+import asyncio
+import codecs
+import time
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class HostStats:
+    """Скользящее окно задержек запросов к одному хосту.
+
+    Таймауты записываются цензурированными значениями (задержка = таймаут),
+    иначе медленный хост никогда не поднимет собственный таймаут.
+    """
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self.latencies.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(q / 100 * len(ordered)))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд на cooldown секунд"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        return self.state != self.OPEN
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        # В полуоткрытом состоянии хватает одной неудачной пробы
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class HostPolicy:
+    """Circuit breaker хоста и статистика задержек по видам запросов к нему.
+
+    Вид запроса (kind) отделяет, например, потоковое чтение статей от загрузки
+    целых страниц: p95 одного не должен задавать таймаут другого.
+    """
+
+    def __init__(
+        self,
+        max_timeout: float,
+        min_timeout: float,
+        min_samples: int,
+        timeout_factor: float,
+        failure_threshold: int,
+        cooldown: float
+    ):
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.min_samples = min_samples
+        self.timeout_factor = timeout_factor
+        self.stats: Dict[str, HostStats] = {}
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+
+    def stats_for(self, kind: str) -> HostStats:
+        if kind not in self.stats:
+            self.stats[kind] = HostStats()
+        return self.stats[kind]
+
+    def warmed_up(self, kind: str) -> bool:
+        return len(self.stats_for(kind).latencies) >= self.min_samples
+
+    def record(self, kind: str, latency: float):
+        self.stats_for(kind).record(latency)
+
+    def timeout(self, kind: str) -> float:
+        """Таймаут по p95; пока данных мало или идет пробный запрос — максимальный"""
+        if not self.warmed_up(kind) or self.breaker.state == CircuitBreaker.HALF_OPEN:
+            return self.max_timeout
+        adaptive = self.stats_for(kind).percentile(95) * self.timeout_factor
+        return max(self.min_timeout, min(self.max_timeout, adaptive))
+
+    def hedge_after(self, kind: str) -> Optional[float]:
+        """Через сколько секунд отправлять дублирующий запрос"""
+        if not self.warmed_up(kind) or self.breaker.state == CircuitBreaker.HALF_OPEN:
+            return None
+        return self.stats_for(kind).percentile(95)
+
+
+class HostPolicies:
+    """Реестр HostPolicy по имени хоста"""
+
+    def __init__(self, **policy_kwargs):
+        self.policy_kwargs = policy_kwargs
+        self.policies: Dict[str, HostPolicy] = {}
+
+    def get(self, url: str) -> HostPolicy:
+        host = urlsplit(url).hostname or ""
+        if host not in self.policies:
+            self.policies[host] = HostPolicy(**self.policy_kwargs)
+        return self.policies[host]
+
+
+CHUNK_SIZE = 16 * 1024
+
+
+class FetchResult:
+    """Итог загрузки: статус, текст, прочитанные байты и задержка"""
+
+    __slots__ = ("status", "text", "size", "latency", "hedged")
+
+    def __init__(self, status: int, text: Optional[str], size: int, latency: float, hedged: bool = False):
+        self.status = status
+        self.text = text
+        self.size = size
+        self.latency = latency
+        self.hedged = hedged
+
+
+class EntryContentParser(HTMLParser):
+    """Инкрементально собирает абзацы wp-block-paragraph из первого div.entry-content.
+
+    После закрытия этого div выставляет done, и остаток страницы можно не читать.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[str] = []
+        self.done = False
+        self._div_depth = 0  # Глубина div внутри entry-content, 0 — вне его
+        self._paragraph: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "div":
+            if self._div_depth:
+                self._div_depth += 1
+            elif "entry-content" in (dict(attrs).get("class") or "").split():
+                self._div_depth = 1
+        elif tag == "p" and self._div_depth:
+            self._close_paragraph()
+            if "wp-block-paragraph" in (dict(attrs).get("class") or "").split():
+                self._paragraph = []
+
+    def handle_endtag(self, tag):
+        if self.done or not self._div_depth:
+            return
+        if tag == "p":
+            self._close_paragraph()
+        elif tag == "div":
+            self._div_depth -= 1
+            if not self._div_depth:
+                self._close_paragraph()
+                self.done = True
+
+    def handle_data(self, data):
+        if self._paragraph is not None:
+            self._paragraph.append(data)
+
+    def _close_paragraph(self):
+        if self._paragraph is not None:
+            self.paragraphs.append("".join(self._paragraph))
+            self._paragraph = None
+
+    def text(self) -> str:
+        self._close_paragraph()
+        return "\n".join(self.paragraphs)
+
+
+def _decoder(response: aiohttp.ClientResponse):
+    try:
+        return codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+async def read_text(response: aiohttp.ClientResponse, max_bytes: int) -> Tuple[str, int]:
+    """Читает тело ответа целиком, но не больше max_bytes"""
+    decoder = _decoder(response)
+    parts, size = [], 0
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        chunk = chunk[:max_bytes - size]
+        size += len(chunk)
+        parts.append(decoder.decode(chunk))
+        if size >= max_bytes:
+            break
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts), size
+
+
+async def read_entry_content(response: aiohttp.ClientResponse, max_bytes: int) -> Tuple[str, int]:
+    """Потоково извлекает текст статьи и прекращает чтение после закрытия entry-content"""
+    decoder = _decoder(response)
+    parser = EntryContentParser()
+    size = 0
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        chunk = chunk[:max_bytes - size]
+        size += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done or size >= max_bytes:
+            break
+    # Страница могла оборваться внутри entry-content: дочитываем то, что придержали декодер и парсер
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.text(), size
+
+
+Reader = Callable[["aiohttp.ClientResponse"], Awaitable[Tuple[str, int]]]
+
+
+async def _get(session: aiohttp.ClientSession, url: str, timeout: float, reader: Reader) -> FetchResult:
+    import aiohttp
+
+    started = time.monotonic()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status != 200:
+            return FetchResult(response.status, None, 0, time.monotonic() - started)
+        text, size = await reader(response)
+        return FetchResult(response.status, text, size, time.monotonic() - started)
+
+
+async def hedged_get(
+    session: aiohttp.ClientSession,
+    url: str,
+    timeout: float,
+    hedge_after: Optional[float],
+    reader: Reader
+) -> FetchResult:
+    """GET с дублирующим запросом, если первый не уложился в hedge_after.
+
+    Если дубль отправлен, задержкой считается время от начала первого запроса:
+    иначе медленный хвост выпадает из статистики хоста.
+    """
+    started = time.monotonic()
+    first = asyncio.create_task(_get(session, url, timeout, reader))
+    pending = {first}
+    try:
+        if hedge_after is None or hedge_after >= timeout:
+            return await first
+
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        hedge = asyncio.create_task(_get(session, url, timeout, reader))
+        pending.add(hedge)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    result = task.result()
+                    result.latency = time.monotonic() - started
+                    result.hedged = task is hedge
+                    return result
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        # Отмененные запросы должны завершиться до закрытия сессии вызывающим
+        await asyncio.gather(*pending, return_exceptions=True)
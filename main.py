@@ -1,37 +1,38 @@
+from __future__ import annotations
+
 from config import (
     BOT_TOKEN, MISTRAL_API_KEY, ADMINS, TECHCRUNCH_URL,
     COLLECTION_TIME, POSTING_TIME, CHANNEL_ID
 )
-from db import Database
-
-from typing import Optional
+from tracing import span, trace_run, RunTrace
+from singleflight import SingleFlight
+from search_index import SearchIndex
+from articles import Article, ArticleStore
+from fetcher import HostPolicies, hedged_get, read_text, read_entry_content
+
+# aiogram, mistralai, bs4, aiohttp и supabase импортируются лениво: импорт main
+# (например, ради is_admin в тестах) не должен тянуть их и создавать клиентов
+from typing import Optional, TYPE_CHECKING
 import logging
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InputMediaPhoto, InputMediaVideo
-from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.context import FSMContext
-from mistralai import Mistral
-import aiohttp
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta, time
 import asyncio
 import pytz
 import re
 import json
 
-# Инициализация клиента Mistral
-mistral_client = Mistral(api_key=MISTRAL_API_KEY)
-
-# Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+if TYPE_CHECKING:
+    import aiohttp
+    from aiogram import Bot, Dispatcher, types
+    from aiogram.filters import CommandObject
+    from aiogram.fsm.context import FSMContext
+    from mistralai import Mistral
+    from db import Database
 
-# Состояния FSM
-class PostStates(StatesGroup):
-    waiting_for_time = State()
-    waiting_for_approval = State()
-    waiting_for_media = State()
+# Клиенты создаются при первом обращении (get_bot, get_mistral_client) или в create_app
+mistral_client = None
+bot = None
+dp = None
+PostStates = None  # Состояния FSM, см. get_post_states
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -45,30 +46,134 @@ pending_media = []
 MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 schedule_task = None
 POST_NOTIFICATION_TEMPLATE = "📢 Пост опубликован в канале\n\nID сообщения: `{message_id}`\n\n{text}"
-articles_data = []  # Будет хранить сырые данные статей
-used_articles = []  # Будет хранить статьи, использованные в посте
-HTTP_TIMEOUT = 10
+articles_data = []  # Статьи последнего сбора (Article, тексты — в article_store)
+used_articles = []  # Статьи, использованные в посте
+HTTP_TIMEOUT = 10  # Верхняя граница таймаута загрузки страницы
+MIN_HTTP_TIMEOUT = 2  # Нижняя граница адаптивного таймаута
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # Жесткий лимит на размер загружаемой страницы
 MAX_RETRIES = 2
+RETRY_DELAY = 0.5
+CIRCUIT_FAILURES = 3  # Ошибок подряд, после которых хост исключается
+CIRCUIT_COOLDOWN = 300  # Секунд до пробного запроса к исключенному хосту
+linked_chat_id = None  # Кеш ID чата комментариев канала
+linked_chat_id_loaded = False
+database = None
+background_tasks = set()  # Фоновые шаги публикации
+search_index = None  # Локальный полнотекстовый индекс messages, см. get_search_index
+SEARCH_INDEX_PATH = "search_index.sqlite3"
+article_store = None  # Сжатые тексты статей, см. get_article_store
+ARTICLE_STORE_PATH = "articles.sqlite3"
+ARTICLE_STORE_LIMIT = 1000  # Сколько последних текстов статей хранить
+DISCUSSION_LOOKUP_TIMEOUT = 5  # Секунд на ожидание автопересылки поста в чат комментариев
+discussion_waiters = {}  # Текст поста -> Future с ID его автопересылки в чате комментариев
+post_generation = SingleFlight()  # Одна генерация поста на всех одновременных запросивших
+TRACE_FILE = "traces.jsonl"  # Трассы прогонов генерации постов
+SLOW_RUN_THRESHOLD = 120  # Секунд; более медленные прогоны отправляются админам
+host_policies = HostPolicies(
+    max_timeout=HTTP_TIMEOUT,
+    min_timeout=MIN_HTTP_TIMEOUT,
+    min_samples=5,
+    timeout_factor=3,
+    failure_threshold=CIRCUIT_FAILURES,
+    cooldown=CIRCUIT_COOLDOWN
+)
 
 # Проверка прав администратора
 def is_admin(user_id: str) -> bool:
     return str(user_id) in ADMINS
 
+def get_bot() -> Bot:
+    """Бот создается при первом обращении"""
+    global bot
+    if bot is None:
+        from aiogram import Bot
+        bot = Bot(token=BOT_TOKEN)
+    return bot
+
+def get_mistral_client() -> Mistral:
+    """Клиент Mistral создается при первом обращении"""
+    global mistral_client
+    if mistral_client is None:
+        from mistralai import Mistral
+        mistral_client = Mistral(api_key=MISTRAL_API_KEY)
+    return mistral_client
+
+def get_post_states():
+    """Состояния FSM; класс объявляется при первом обращении, чтобы не импортировать aiogram заранее"""
+    global PostStates
+    if PostStates is None:
+        from aiogram.fsm.state import State, StatesGroup
+
+        class PostStates(StatesGroup):
+            waiting_for_time = State()
+            waiting_for_approval = State()
+            waiting_for_media = State()
+    return PostStates
+
 async def get_linked_chat_id():
-    """Получает ID связанного чата комментариев"""
+    """Получает ID связанного чата комментариев (запрашивается один раз и кешируется)"""
+    global linked_chat_id, linked_chat_id_loaded
+    if linked_chat_id_loaded:
+        return linked_chat_id
     try:
-        chat = await bot.get_chat(CHANNEL_ID)
-        if chat.linked_chat_id:
-            logger.info(f"Найден linked_chat_id: {chat.linked_chat_id}")
-            return chat.linked_chat_id
+        chat = await get_bot().get_chat(CHANNEL_ID)
+        linked_chat_id = chat.linked_chat_id
+        linked_chat_id_loaded = True
+        if linked_chat_id:
+            logger.info(f"Найден linked_chat_id: {linked_chat_id}")
+            return linked_chat_id
         logger.warning("У канала нет связанного чата комментариев")
         return None
     except Exception as e:
         logger.error(f"Ошибка получения linked_chat_id: {e}")
         return None
 
+def get_search_index() -> SearchIndex:
+    """Локальный поисковый индекс открывается при первом обращении"""
+    global search_index
+    if search_index is None:
+        search_index = SearchIndex(SEARCH_INDEX_PATH)
+    return search_index
+
+def get_article_store() -> ArticleStore:
+    """Хранилище текстов статей открывается при первом обращении"""
+    global article_store
+    if article_store is None:
+        article_store = ArticleStore(ARTICLE_STORE_PATH, ARTICLE_STORE_LIMIT)
+    return article_store
+
+def get_database() -> Database:
+    """Единственный экземпляр Database на процесс"""
+    global database
+    if database is None:
+        from db import Database
+        database = Database(search_index=get_search_index())
+    return database
+
+async def rebuild_search_index() -> Optional[int]:
+    """Перестраивает поисковый индекс по всей таблице messages в Supabase; None при ошибке"""
+    try:
+        messages = await get_database().get_all_messages()
+        if messages is None:
+            logger.error("Не удалось выгрузить сообщения для поискового индекса")
+            return None
+        added = await asyncio.to_thread(get_search_index().rebuild, messages)
+    except Exception as e:
+        logger.error(f"Ошибка перестройки поискового индекса: {e}")
+        return None
+    logger.info(f"Поисковый индекс перестроен: {added} сообщений")
+    return added
+
+def run_in_background(coro):
+    """Запускает задачу вне пути ответа админу и держит ссылку до ее завершения"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 # Клавиатура для админа
 def get_admin_keyboard():
+    from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
     keyboard = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="🔄 Статус"), KeyboardButton(text="⏰ Изменить время")],
@@ -82,6 +187,7 @@ def get_admin_keyboard():
 
 # Обновленная клавиатура для одобрения поста
 def get_approval_keyboard():
+    from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
     keyboard = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="✅ Опубликовать"), KeyboardButton(text="🔄 Перегенерировать")],
@@ -92,12 +198,16 @@ def get_approval_keyboard():
     )
     return keyboard
 
+def get_remove_keyboard():
+    from aiogram.types import ReplyKeyboardRemove
+    return ReplyKeyboardRemove()
+
 
 async def send_error_to_admin(error_message: str):
     """Отправляет сообщение об ошибке админу"""
     try:
         for admin_id in ADMINS:
-            await bot.send_message(
+            await get_bot().send_message(
                 chat_id=admin_id,
                 text=f"🚨 Ошибка в боте:\n\n{error_message}",
                 reply_markup=get_admin_keyboard()
@@ -105,78 +215,157 @@ async def send_error_to_admin(error_message: str):
     except Exception as e:
         logger.error(f"Не удалось отправить сообщение об ошибке админу: {e}")
 
-async def fetch_article_content(url: str) -> Optional[str]:
-    """Загружает содержимое статьи с заданным таймаутом и повторными попытками"""
-    for attempt in range(1, MAX_RETRIES + 1):
+async def send_slow_run_report(run: RunTrace):
+    """Отправляет админам диаграмму медленного прогона генерации"""
+    for admin_id in ADMINS:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    logger.warning(f"Статус ответа {response.status} для URL: {url}")
-                    return None
-        except asyncio.TimeoutError:
-            logger.warning(f"Таймаут при попытке {attempt}/{MAX_RETRIES} получить статью: {url}")
-            if attempt == MAX_RETRIES:
-                logger.error(f"Не удалось получить статью после {MAX_RETRIES} попыток: {url}")
-                return None
-            await asyncio.sleep(1)  # Задержка перед повторной попыткой
+            await get_bot().send_message(
+                chat_id=admin_id,
+                text=f"🐢 Медленная генерация поста:\n\n{run.waterfall()}"
+            )
         except Exception as e:
-            logger.error(f"Ошибка при получении статьи {url}: {str(e)}")
+            logger.error(f"Не удалось отправить отчет админу {admin_id}: {e}")
+
+def trace_generation(name: str):
+    """Прогон генерации поста с записью трассы в TRACE_FILE"""
+    return trace_run(name, TRACE_FILE, SLOW_RUN_THRESHOLD, send_slow_run_report)
+
+async def read_page(response: aiohttp.ClientResponse):
+    return await read_text(response, MAX_PAGE_BYTES)
+
+async def read_article_text(response: aiohttp.ClientResponse):
+    return await read_entry_content(response, MAX_PAGE_BYTES)
+
+async def fetch_article_content(url: str, extract_content: bool = False) -> Optional[str]:
+    """Загружает статью с адаптивным таймаутом, хеджированием и повторными попытками.
+
+    С extract_content=True страница читается потоково и возвращается только текст
+    абзацев из entry-content; чтение прекращается сразу после его закрытия.
+    """
+    import aiohttp
+
+    policy = host_policies.get(url)
+    # Задержки потокового чтения статьи и загрузки целой страницы учитываются раздельно
+    kind, reader = ("article", read_article_text) if extract_content else ("page", read_page)
+    with span("fetch_article_content", url=url, extract_content=extract_content) as s:
+        if not policy.breaker.allow():
+            s.set("circuit", "open")
+            logger.warning(f"Хост временно отключен после серии ошибок, пропускаем: {url}")
             return None
-    return None
+
+        for attempt in range(1, MAX_RETRIES + 1):
+            timeout = policy.timeout(kind)
+            s.set("attempts", attempt)
+            s.set("timeout", round(timeout, 3))
+            try:
+                async with aiohttp.ClientSession() as session:
+                    result = await hedged_get(session, url, timeout, policy.hedge_after(kind), reader)
+                s.set("status", result.status)
+                if result.hedged:
+                    s.set("hedged", True)
+
+                if result.status == 200:
+                    policy.record(kind, result.latency)
+                    policy.breaker.record_success()
+                    s.set("bytes", result.size)
+                    if result.size >= MAX_PAGE_BYTES:
+                        s.set("truncated", True)
+                        logger.warning(f"Страница обрезана по лимиту {MAX_PAGE_BYTES} байт: {url}")
+                    return result.text
+                if result.status < 500:
+                    logger.warning(f"Статус ответа {result.status} для URL: {url}")
+                    return None
+                logger.warning(f"Статус ответа {result.status} при попытке {attempt}/{MAX_RETRIES}: {url}")
+            except asyncio.TimeoutError:
+                # Цензурированная выборка: запрос длился не меньше таймаута
+                policy.record(kind, timeout)
+                logger.warning(f"Таймаут {timeout:.1f} с при попытке {attempt}/{MAX_RETRIES} получить статью: {url}")
+            except aiohttp.ClientError as e:
+                logger.warning(f"Ошибка соединения при попытке {attempt}/{MAX_RETRIES} для {url}: {e}")
+            except Exception as e:
+                logger.error(f"Ошибка при получении статьи {url}: {str(e)}")
+                return None
+
+            policy.breaker.record_failure()
+            if not policy.breaker.allow():
+                s.set("circuit", "open")
+                logger.error(f"Хост отключен на {CIRCUIT_COOLDOWN} с после {CIRCUIT_FAILURES} ошибок подряд: {url}")
+                return None
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(RETRY_DELAY)  # Задержка перед повторной попыткой
+
+        logger.error(f"Не удалось получить статью после {MAX_RETRIES} попыток: {url}")
+        return None
 
 async def get_articles():
     """Сбор статей с TechCrunch с обработкой таймаутов"""
-    logger.info("Начало сбора статей с TechCrunch")
-    try:
-        # Получаем главную страницу
-        main_page_content = await fetch_article_content(TECHCRUNCH_URL)
-        if not main_page_content:
-            logger.error("Не удалось получить главную страницу TechCrunch")
-            return []
+    from bs4 import BeautifulSoup
+
+    with span("get_articles") as s:
+        logger.info("Начало сбора статей с TechCrunch")
+        try:
+            # Получаем главную страницу
+            main_page_content = await fetch_article_content(TECHCRUNCH_URL)
+            if not main_page_content:
+                logger.error("Не удалось получить главную страницу TechCrunch")
+                return []
         
-        soup = BeautifulSoup(main_page_content, 'html.parser')
-        articles = []
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        time_threshold = datetime.now(moscow_tz) - timedelta(hours=20)
+            soup = BeautifulSoup(main_page_content, 'html.parser')
+            del main_page_content
+            moscow_tz = pytz.timezone('Europe/Moscow')
+            time_threshold = datetime.now(moscow_tz) - timedelta(hours=20)
+            cards = []  # (url, заголовок) свежих статей
 
-        for card in soup.find_all('div', class_='loop-card__content'):
-            try:
-                title_link = card.find('h3', class_='loop-card__title').find('a', class_='loop-card__title-link')
-                time_elem = card.find('time', class_='loop-card__time')
+            for card in soup.find_all('div', class_='loop-card__content'):
+                try:
+                    title_link = card.find('h3', class_='loop-card__title').find('a', class_='loop-card__title-link')
+                    time_elem = card.find('time', class_='loop-card__time')
                 
-                if title_link and time_elem:
-                    article_url = title_link['href']
-                    article_time = datetime.fromisoformat(time_elem['datetime'].replace('Z', '+00:00'))
-                    article_time = article_time.astimezone(moscow_tz)
+                    if title_link and time_elem:
+                        article_time = datetime.fromisoformat(time_elem['datetime'].replace('Z', '+00:00'))
+                        article_time = article_time.astimezone(moscow_tz)
                     
-                    if article_time >= time_threshold:
-                        article_html = await fetch_article_content(article_url)
-                        if not article_html:
-                            continue
-                        
-                        article_soup = BeautifulSoup(article_html, 'html.parser')
-                        content = article_soup.find('div', class_='entry-content')
-                        paragraphs = content.find_all('p', class_='wp-block-paragraph') if content else []
-                        article_text = '\n'.join(p.get_text() for p in paragraphs)
-                        
-                        articles.append({
-                            'url': article_url,
-                            'title': title_link.get_text(),
-                            'content': article_text
-                        })
-                        logger.info(f"Собрана статья: {title_link.get_text()}")
-            except Exception as e:
-                logger.error(f"Ошибка при обработке статьи: {e}")
-                continue
-        
-        logger.info(f"Собрано {len(articles)} статей")
-        return articles
-    except Exception as e:
-        logger.error(f"Критическая ошибка при сборе статей: {e}")
-        await send_error_to_admin(f"Критическая ошибка при сборе статей: {e}")
-        return []
+                        if article_time >= time_threshold:
+                            cards.append((title_link['href'], title_link.get_text()))
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке статьи: {e}")
+                    continue
+            
+            # Дерево разбора больше не нужно — освобождаем его до загрузки статей
+            soup.decompose()
+            del soup
+            
+            store = get_article_store()
+            articles = []
+            for article_url, title in cards:
+                try:
+                    article_text = await fetch_article_content(article_url, extract_content=True)
+                    if article_text is None:
+                        continue
+                    
+                    # Текст уходит в сжатое хранилище; в памяти остается только запись
+                    await asyncio.to_thread(store.save, article_url, article_text)
+                    # Отмечаем статьи, которые (или чьи темы) уже были в канале
+                    covered_by = await asyncio.to_thread(get_search_index().find_covered, article_url, title)
+                    articles.append(Article(article_url, title, store, covered_by=covered_by))
+                    logger.info(f"Собрана статья: {title}")
+                    if covered_by is not None:
+                        logger.info(f"Тема уже освещалась в посте {covered_by}: {title}")
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке статьи: {e}")
+                    continue
+            
+            articles.sort(key=lambda a: a.covered_by is not None)
+            await asyncio.to_thread(store.prune)
+            
+            s.set("articles", len(articles))
+            s.set("covered", sum(a.covered_by is not None for a in articles))
+            logger.info(f"Собрано {len(articles)} статей")
+            return articles
+        except Exception as e:
+            logger.error(f"Критическая ошибка при сборе статей: {e}")
+            await send_error_to_admin(f"Критическая ошибка при сборе статей: {e}")
+            return []
 
 async def compile_post(articles):
     """Компиляция поста с обработкой таймаутов"""
@@ -195,15 +384,21 @@ async def compile_post(articles):
             selection_prompt = (
                 "Выбери 3 самые интересные статьи из списка ниже. "
                 "Верни только JSON с ключами: selected (индексы выбранных статей 0-2), "
-                "reason (краткое объяснение выбора).\n\n" +
-                "\n".join(f"{i}. {a['title']}" for i, a in enumerate(articles[:5])))
+                "reason (краткое объяснение выбора). "
+                "Статьи с пометкой «уже было» выбирай, только если не хватает других.\n\n" +
+                "\n".join(
+                    f"{i}. {a.title}" + (" (уже было)" if a.covered_by is not None else "")
+                    for i, a in enumerate(articles[:5])
+                ))
             
             try:
-                selection_response = mistral_client.chat.complete(
-                    model="mistral-large-latest",
-                    messages=[{"role": "user", "content": selection_prompt}],
-                    response_format={"type": "json_object"}
-                )
+                with span("mistral.select", attempt=attempt + 1, prompt_chars=len(selection_prompt)) as s:
+                    selection_response = get_mistral_client().chat.complete(
+                        model="mistral-large-latest",
+                        messages=[{"role": "user", "content": selection_prompt}],
+                        response_format={"type": "json_object"}
+                    )
+                    s.set("response_chars", len(selection_response.choices[0].message.content or ""))
                 logger.debug(f"Ответ от Mistral (выбор статей): {selection_response}")
             except asyncio.TimeoutError:
                 logger.warning("Таймаут при генерации выбора статей")
@@ -212,21 +407,25 @@ async def compile_post(articles):
                 
             selection = json.loads(selection_response.choices[0].message.content)
             used_articles = [articles[i] for i in selection.get('selected', [0,1,2])]
+            # Тексты выбранных статей читаются из хранилища одним запросом вне цикла событий
+            contents = await asyncio.to_thread(get_article_store().load_many, [a.url for a in used_articles])
             
             ### Этап 2: Генерация поста
             generation_prompt = (
                 "Создай подробный пост для Telegram-канала, на основе следующих статей:" +
-                "\n\n".join(f"{a['title']}\n{a['content'][:300]}..." for a in used_articles) +
+                "\n\n".join(f"{a.title}\n{content[:300]}..." for a, content in zip(used_articles, contents)) +
                 "\n\nСделай пост не длиннее 800 символов, добавь эмодзи и структурируй текст. "
                 "Ни в коем случае не вставляй ссылки на статьи. "
                 "Если пост получается слишком длинным, сократи его, оставив только самое важное."
             )
             
             try:
-                generation_response = mistral_client.chat.complete(
-                    model="mistral-large-latest",
-                    messages=[{"role": "user", "content": generation_prompt}]
-                )
+                with span("mistral.generate", attempt=attempt + 1, prompt_chars=len(generation_prompt)) as s:
+                    generation_response = get_mistral_client().chat.complete(
+                        model="mistral-large-latest",
+                        messages=[{"role": "user", "content": generation_prompt}]
+                    )
+                    s.set("response_chars", len(generation_response.choices[0].message.content or ""))
                 logger.debug(f"Ответ от Mistral (генерация поста): {generation_response}")
             except asyncio.TimeoutError:
                 logger.warning("Таймаут при генерации поста")
@@ -245,7 +444,7 @@ async def compile_post(articles):
                 if attempt < max_attempts:
                     for admin_id in ADMINS:
                         try:
-                            await bot.send_message(
+                            await get_bot().send_message(
                                 chat_id=admin_id,
                                 text=f"⚠️ Пост слишком длинный ({len(post)} символов). Пытаюсь сгенерировать более короткий вариант (попытка {attempt}/{max_attempts})..."
                             )
@@ -262,7 +461,7 @@ async def compile_post(articles):
     await send_error_to_admin(error_msg)
     return None
     
-async def generate_daily_post():
+async def build_daily_post():
     """Генерация ежедневного поста с сохранением данных статей"""
     global articles_data
     articles_data = await get_articles()  # Сохраняем сырые данные
@@ -272,6 +471,17 @@ async def generate_daily_post():
         
     return await compile_post(articles_data)
 
+async def generate_daily_post(force_new: bool = False):
+    """Генерация поста; одновременные вызовы получают результат одной генерации.
+
+    force_new=True (перегенерация) не переиспользует уже идущую обычную генерацию,
+    а запускает новую после нее.
+    """
+    with span("generate_daily_post", force_new=force_new) as s:
+        if post_generation.joins("daily_post", force_new):
+            s.set("joined", True)
+        return await post_generation.do("daily_post", build_daily_post, force_new=force_new)
+
 async def schedule_post():
     """Планирует ежедневную публикацию в заданное время по МСК"""
     global posting_enabled, post_time, pending_post, pending_media
@@ -296,23 +506,24 @@ async def schedule_post():
         if not posting_enabled:
             continue
             
-        post_content = await generate_daily_post()
-        if post_content:
-            pending_post = post_content
-            pending_media = []
-            
-            # Отправляем пост на одобрение всем админам
-            for admin_id in ADMINS:
-                try:
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=f"📝 Новый пост для одобрения:\n\n{post_content}",
-                        reply_markup=get_approval_keyboard()
-                    )
-                except Exception as e:
-                    logger.error(f"Не удалось отправить пост на одобрение админу {admin_id}: {e}")
+        async with trace_generation("schedule_post"):
+            post_content = await generate_daily_post()
+            if post_content:
+                pending_post = post_content
+                pending_media = []
+                
+                # Отправляем пост на одобрение всем админам
+                with span("notify_admins", admins=len(ADMINS), text_chars=len(post_content)):
+                    for admin_id in ADMINS:
+                        try:
+                            await get_bot().send_message(
+                                chat_id=admin_id,
+                                text=f"📝 Новый пост для одобрения:\n\n{post_content}",
+                                reply_markup=get_approval_keyboard()
+                            )
+                        except Exception as e:
+                            logger.error(f"Не удалось отправить пост на одобрение админу {admin_id}: {e}")
 
-@dp.message(Command("start"))
 async def cmd_start(message: types.Message):
     if is_admin(message.from_user.id):
         await message.answer(
@@ -324,7 +535,6 @@ async def cmd_start(message: types.Message):
     else:
         await message.answer("Доступ запрещен")
 
-@dp.message(F.text == "ℹ️ Помощь", lambda message: is_admin(message.from_user.id))
 async def cmd_help(message: types.Message):
     help_text = (
         "📚 Справка по командам:\n\n"
@@ -339,11 +549,12 @@ async def cmd_help(message: types.Message):
         "✏️ Редактировать - изменить текст вручную\n"
         "📷 Добавить медиа - прикрепить фото/видео\n"
         "🚫 Отменить - удалить текущий пост\n"
-        "⏱ Отложить - сохранить для публикации позже"
+        "⏱ Отложить - сохранить для публикации позже\n\n"
+        "/search <запрос> - поиск по опубликованным постам и комментариям\n"
+        "/reindex - перестроить поисковый индекс из базы данных"
     )
     await message.answer(help_text, reply_markup=get_admin_keyboard())
 
-@dp.message(F.text == "📝 Создать пост")
 async def manual_post(message: types.Message):
     if not is_admin(message.from_user.id):
         await message.answer("❌ Доступ запрещён")
@@ -354,207 +565,238 @@ async def manual_post(message: types.Message):
     
     # Удаляем клавиатуру на время обработки
     await message.answer("🔄 Собираю статьи и генерирую пост...", 
-                        reply_markup=types.ReplyKeyboardRemove())
+                        reply_markup=get_remove_keyboard())
     
     try:
-        post_content = await generate_daily_post()
-        if not post_content:
-            await message.answer("❌ Не удалось создать пост. Попробуйте позже.",
-                               reply_markup=get_admin_keyboard())
-            return
-            
-        pending_post = post_content
-        await message.answer(
-            f"📝 Пост готов к публикации:\n\n{post_content}",
-            reply_markup=get_approval_keyboard()
-        )
-        
-        # Уведомление других админов
-        for admin_id in ADMINS:
-            if str(admin_id) != str(message.from_user.id):
-                try:
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=f"📝 Новый пост от {message.from_user.full_name}:\n\n{post_content}",
-                        reply_markup=get_approval_keyboard()
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка уведомления админа {admin_id}: {e}")
+        async with trace_generation("manual_post"):
+            post_content = await generate_daily_post()
+            if not post_content:
+                await message.answer("❌ Не удалось создать пост. Попробуйте позже.",
+                                   reply_markup=get_admin_keyboard())
+                return
+                
+            pending_post = post_content
+            with span("notify_admins", admins=len(ADMINS), text_chars=len(post_content)):
+                await message.answer(
+                    f"📝 Пост готов к публикации:\n\n{post_content}",
+                    reply_markup=get_approval_keyboard()
+                )
+                
+                # Уведомление других админов
+                for admin_id in ADMINS:
+                    if str(admin_id) != str(message.from_user.id):
+                        try:
+                            await get_bot().send_message(
+                                chat_id=admin_id,
+                                text=f"📝 Новый пост от {message.from_user.full_name}:\n\n{post_content}",
+                                reply_markup=get_approval_keyboard()
+                            )
+                        except Exception as e:
+                            logger.error(f"Ошибка уведомления админа {admin_id}: {e}")
                     
     except Exception as e:
         logger.error(f"Ошибка при создании поста: {str(e)}")
         await message.answer(f"❌ Произошла ошибка: {str(e)}",
                            reply_markup=get_admin_keyboard())
 
-@dp.message(F.text == "✅ Опубликовать", lambda message: is_admin(message.from_user.id))
-async def approve_post(message: types.Message):
-    global pending_post, pending_media, used_articles
-    
-    if not pending_post:
-        await message.answer("❌ Нет поста для публикации")
-        return
+async def publish_to_channel(post_text: str, media_items: list) -> int:
+    """Публикует пост в канал, возвращает ID сообщения"""
+    if media_items:
+        from aiogram.types import InputMediaPhoto, InputMediaVideo
+        media = [
+            InputMediaPhoto(media=m['file_id'], caption=post_text if i == 0 else None)
+            if m['type'] == 'photo' else
+            InputMediaVideo(media=m['file_id'], caption=post_text if i == 0 else None)
+            for i, m in enumerate(media_items)
+        ]
+        sent_messages = await get_bot().send_media_group(CHANNEL_ID, media=media)
+        return sent_messages[0].message_id
+
+    sent_message = await get_bot().send_message(CHANNEL_ID, text=post_text)
+    return sent_message.message_id
+
+def expect_discussion_message(post_text: str) -> asyncio.Future:
+    """Future с ID автопересылки поста в чате комментариев.
+
+    Создается до отправки в канал: автопересылка может прийти раньше, чем
+    вернется ответ на отправку.
+    """
+    future = asyncio.get_running_loop().create_future()
+    discussion_waiters[post_text.strip()] = future
+    return future
+
+async def on_discussion_forward(message: types.Message):
+    """Автопересылка поста канала в чат комментариев: передает ее ID ожидающей публикации"""
+    future = discussion_waiters.pop((message.text or message.caption or "").strip(), None)
+    if future is not None and not future.done():
+        future.set_result(message.message_id)
+
+async def find_discussion_message(post_text: str, future: asyncio.Future) -> Optional[int]:
+    """Ждет автопересылку поста в чате комментариев не дольше DISCUSSION_LOOKUP_TIMEOUT"""
+    try:
+        return await asyncio.wait_for(future, DISCUSSION_LOOKUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        if discussion_waiters.get(post_text.strip()) is future:
+            del discussion_waiters[post_text.strip()]
+
+async def save_post(message: types.Message, post_text: str, articles: list, discussion_message_id: Optional[int]) -> str:
+    """Сохраняет пост в базу данных и возвращает текст уведомления для админов"""
+    urls = [a.url for a in articles] if articles else None
+    url = json.dumps(urls) if urls else None  # Сериализуем список в JSON
     
     try:
-        # 1. Получаем ID связанного чата комментариев
-        linked_chat_id = await get_linked_chat_id()
-        if not linked_chat_id:
-            logger.warning("У канала нет связанного чата комментариев")
-            await message.answer("⚠️ Чат комментариев не найден")
+        inserted_post = await get_database().insert_post(
+            telegram_id=discussion_message_id,
+            message_text=post_text,
+            url=url,
+            user_id=message.from_user.id,
+            username=message.from_user.full_name
+        )
         
-        # 2. Публикация поста в канал
-        if pending_media:
-            media = [
-                InputMediaPhoto(media=m['file_id'], caption=pending_post if i == 0 else None)
-                if m['type'] == 'photo' else
-                InputMediaVideo(media=m['file_id'], caption=pending_post if i == 0 else None)
-                for i, m in enumerate(pending_media)
-            ]
-            sent_messages = await bot.send_media_group(CHANNEL_ID, media=media)
-            channel_message_id = sent_messages[0].message_id
-            media_group_id = sent_messages[0].media_group_id
+        if inserted_post:
+            notification_text = f"✅ Пост успешно добавлен (ID: {inserted_post.get('id')})"
+            logger.info(notification_text)
         else:
-            sent_message = await bot.send_message(CHANNEL_ID, text=pending_post)
-            channel_message_id = sent_message.message_id
-            media_group_id = None
-        
-        # 3. Поиск сообщения в чате комментариев
-        discussion_message_id = None
-        if linked_chat_id:
-            try:
-                await asyncio.sleep(2)
-                updates = await bot.get_updates(limit=10, timeout=3)
-                
-                for update in updates:
-                    msg = update.message
-                    if not msg:
-                        continue
-                        
-                    if media_group_id and hasattr(msg, 'media_group_id'):
-                        if (msg.chat.id == linked_chat_id and 
-                            msg.media_group_id == media_group_id):
-                            discussion_message_id = msg.message_id
-                            break
-                    elif (msg.chat.id == linked_chat_id and
-                          msg.text == pending_post):
-                        discussion_message_id = msg.message_id
-                        break
-                
-                logger.info(f"Найден ID в чате: {discussion_message_id}")
-                
-            except Exception as e:
-                logger.error(f"Ошибка поиска сообщения: {e}")
+            notification_text = "❌ Не удалось сохранить пост в базу данных"
+            logger.error(notification_text)
         
-        # 4. Добавление записи в базу данных
-        db = Database()
-        urls = [a['url'] for a in used_articles] if used_articles else None
-        url = json.dumps(urls) if urls else None  # Сериализуем список в JSON
+    except Exception as e:
+        error_msg = str(e)
+        if "violates foreign key constraint" in error_msg:
+            # Извлекаем parent_id из сообщения об ошибке
+            match = re.search(r'parent_id=(\d+)', error_msg)
+            parent_id = match.group(1) if match else "unknown"
+            notification_text = f"❌ Ошибка при добавлении поста: parent_id={parent_id} не существует"
+        else:
+            notification_text = f"❌ Ошибка при добавлении поста: {error_msg}"
         
+        logger.error(notification_text)
+    
+    return notification_text
+
+async def notify_admins(text: str, **kwargs):
+    """Рассылает сообщение всем админам параллельно"""
+    async def send(admin_id):
         try:
-            inserted_post = await db.insert_post(
-                telegram_id=discussion_message_id,
-                message_text=pending_post,
-                url=url,
-                user_id=message.from_user.id,
-                username=message.from_user.full_name
-            )
-            
-            if inserted_post:
-                notification_text = f"✅ Пост успешно добавлен (ID: {inserted_post.get('id')})"
-                logger.info(notification_text)
-            else:
-                notification_text = "❌ Не удалось сохранить пост в базу данных"
-                logger.error(notification_text)
-            
+            await get_bot().send_message(chat_id=admin_id, text=text, **kwargs)
         except Exception as e:
-            error_msg = str(e)
-            if "violates foreign key constraint" in error_msg:
-                # Извлекаем parent_id из сообщения об ошибке
-                match = re.search(r'parent_id=(\d+)', error_msg)
-                parent_id = match.group(1) if match else "unknown"
-                notification_text = f"❌ Ошибка при добавлении поста: parent_id={parent_id} не существует"
-            else:
-                notification_text = f"❌ Ошибка при добавлении поста: {error_msg}"
-            
-            logger.error(notification_text)
-        
-        # 5. Уведомление администраторов
-        for admin_id in ADMINS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=notification_text,
-                    parse_mode="Markdown",
-                    reply_markup=get_admin_keyboard()
-                )
-            except Exception as e:
-                logger.error(f"Не удалось отправить уведомление админу {admin_id}: {e}")
+            logger.error(f"Не удалось отправить уведомление админу {admin_id}: {e}")
+
+    await asyncio.gather(*(send(admin_id) for admin_id in ADMINS))
+
+async def record_publication(message: types.Message, post_text: str, articles: list,
+                             discussion_message: Optional[asyncio.Future]):
+    """Поиск в чате комментариев → запись в БД → уведомление админов"""
+    discussion_message_id = None
+    if discussion_message is not None:
+        try:
+            discussion_message_id = await find_discussion_message(post_text, discussion_message)
+            logger.info(f"Найден ID в чате: {discussion_message_id}")
+        except Exception as e:
+            logger.error(f"Ошибка поиска сообщения: {e}")
+
+    notification_text = await save_post(message, post_text, articles, discussion_message_id)
+    await notify_admins(notification_text, parse_mode="Markdown", reply_markup=get_admin_keyboard())
+
+async def send_sources(message: types.Message, articles: list):
+    """Отправляет список источников опубликованного поста"""
+    sources_text = "🔗 *Источники:*\n" + "\n".join(
+        f"{i+1}. [{a.title}]({a.url})" for i, a in enumerate(articles)
+    )
+    await message.answer(
+        sources_text,
+        parse_mode="Markdown",
+        disable_web_page_preview=True
+    )
+
+async def finish_publication(message: types.Message, post_text: str, articles: list,
+                             discussion_message: Optional[asyncio.Future]):
+    """Шаги после публикации, не нужные для ответа админу; выполняются параллельно"""
+    steps = [record_publication(message, post_text, articles, discussion_message)]
+    if articles:
+        steps.append(send_sources(message, articles))
+    if discussion_message is None:
+        steps.append(message.answer("⚠️ Чат комментариев не найден"))
+
+    for result in await asyncio.gather(*steps, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка после публикации поста: {result}")
+            await send_error_to_admin(f"Ошибка после публикации поста: {result}")
+
+async def approve_post(message: types.Message):
+    global pending_post, pending_media, used_articles
+    
+    if not pending_post:
+        await message.answer("❌ Нет поста для публикации")
+        return
+    
+    post_text, media_items, articles = pending_post, pending_media, used_articles
+    discussion_message = None
+    
+    try:
+        # 1. ID чата комментариев берется из кеша, заполненного при запуске;
+        # ожидание автопересылки регистрируется до отправки, чтобы ее не пропустить
+        if await get_linked_chat_id():
+            discussion_message = expect_discussion_message(post_text)
         
-        # 6. Отправка источников (если есть)
-        if used_articles:
-            sources_text = "🔗 *Источники:*\n" + "\n".join(
-                f"{i+1}. [{a['title']}]({a['url']})" for i, a in enumerate(used_articles)
-            )
-            await message.answer(
-                sources_text,
-                parse_mode="Markdown",
-                disable_web_page_preview=True
-            )
+        # 2. Публикация поста в канал — единственный шаг на пути ответа админу
+        channel_message_id = await publish_to_channel(post_text, media_items)
+        logger.info(f"Пост опубликован в канале, ID: {channel_message_id}")
         
-        # 7. Сброс состояния
+        # 3. Сброс состояния
         pending_post = None
         pending_media = []
         used_articles = []
         
     except Exception as e:
+        if discussion_message is not None:
+            discussion_message.cancel()
+            discussion_waiters.pop(post_text.strip(), None)
         error_msg = f"❌ Ошибка публикации: {str(e)}"
         logger.error(error_msg)
         await message.answer(error_msg)
         
         # Уведомляем всех админов об ошибке
-        for admin_id in ADMINS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=error_msg,
-                    reply_markup=get_admin_keyboard()
-                )
-            except Exception as send_error:
-                logger.error(f"Не удалось отправить сообщение об ошибке админу {admin_id}: {send_error}")
+        await notify_admins(error_msg, reply_markup=get_admin_keyboard())
+        return
+    
+    # 4. Поиск в чате комментариев, запись в БД, уведомления и источники — в фоне
+    run_in_background(finish_publication(message, post_text, articles, discussion_message))
 
-@dp.message(F.text == "🔄 Перегенерировать", lambda message: is_admin(message.from_user.id))
 async def regenerate_post(message: types.Message):
     global pending_post, pending_media
     pending_media = []
     
-    await message.answer("🔄 Создаю новый вариант поста...", reply_markup=types.ReplyKeyboardRemove())
+    await message.answer("🔄 Создаю новый вариант поста...", reply_markup=get_remove_keyboard())
     
-    post_content = await generate_daily_post()
-    if post_content:
-        pending_post = post_content
-        await message.answer(
-            f"📝 Новый вариант поста:\n\n{post_content}",
-            reply_markup=get_approval_keyboard()
-        )
-    else:
-        await message.answer("❌ Не удалось перегенерировать пост", reply_markup=get_admin_keyboard())
+    async with trace_generation("regenerate_post"):
+        post_content = await generate_daily_post(force_new=True)
+        if post_content:
+            pending_post = post_content
+            with span("notify_admins", admins=1, text_chars=len(post_content)):
+                await message.answer(
+                    f"📝 Новый вариант поста:\n\n{post_content}",
+                    reply_markup=get_approval_keyboard()
+                )
+        else:
+            await message.answer("❌ Не удалось перегенерировать пост", reply_markup=get_admin_keyboard())
 
-@dp.message(F.text == "✏️ Редактировать", lambda message: is_admin(message.from_user.id))
 async def edit_post_manually(message: types.Message, state: FSMContext):
     await message.answer(
         "✏️ Введите новый текст поста:",
-        reply_markup=types.ReplyKeyboardRemove()
+        reply_markup=get_remove_keyboard()
     )
-    await state.set_state(PostStates.waiting_for_approval)
+    await state.set_state(get_post_states().waiting_for_approval)
 
-@dp.message(F.text == "📷 Добавить медиа", lambda message: is_admin(message.from_user.id))
 async def add_media_to_post(message: types.Message, state: FSMContext):
     await message.answer(
         "📎 Прикрепите фото или видео (можно несколько):",
-        reply_markup=types.ReplyKeyboardRemove()
+        reply_markup=get_remove_keyboard()
     )
-    await state.set_state(PostStates.waiting_for_media)
+    await state.set_state(get_post_states().waiting_for_media)
 
-@dp.message(F.text == "🚫 Отменить", lambda message: is_admin(message.from_user.id))
 async def cancel_post(message: types.Message):
     global pending_post, pending_media
     pending_post = None
@@ -564,14 +806,12 @@ async def cancel_post(message: types.Message):
         reply_markup=get_admin_keyboard()
     )   
 
-@dp.message(F.text == "⏱ Отложить", lambda message: is_admin(message.from_user.id))
 async def postpone_post(message: types.Message):
     await message.answer(
         "⏱ Пост сохранен для публикации позже",
         reply_markup=get_admin_keyboard()
     )
 
-@dp.message(PostStates.waiting_for_media, F.photo | F.video, lambda message: is_admin(message.from_user.id))
 async def process_media(message: types.Message, state: FSMContext):
     global pending_media
     
@@ -584,10 +824,9 @@ async def process_media(message: types.Message, state: FSMContext):
     
     await message.answer(
         "📎 Медиа добавлено к посту. Отправьте еще или нажмите /done для завершения.",
-        reply_markup=types.ReplyKeyboardRemove()
+        reply_markup=get_remove_keyboard()
     )
 
-@dp.message(PostStates.waiting_for_media, Command("done"), lambda message: is_admin(message.from_user.id))
 async def finish_adding_media(message: types.Message, state: FSMContext):
     await message.answer(
         f"📝 Пост с медиа для одобрения:\n\n{pending_post}",
@@ -595,17 +834,6 @@ async def finish_adding_media(message: types.Message, state: FSMContext):
     )
     await state.clear()
 
-@dp.message(F.text == "❌ Отменить публикацию", lambda message: is_admin(message.from_user.id))
-async def cancel_post(message: types.Message):
-    global pending_post, pending_media
-    pending_post = None
-    pending_media = []
-    await message.answer(
-        "❌ Публикация отменена",
-        reply_markup=get_admin_keyboard()
-    )
-
-@dp.message(F.text == "⛔ Выкл. автопост", lambda message: is_admin(message.from_user.id))
 async def disable_posting(message: types.Message):
     global posting_enabled
     if posting_enabled:
@@ -614,7 +842,6 @@ async def disable_posting(message: types.Message):
     else:
         await message.answer("ℹ️ Автопостинг уже выключен", reply_markup=get_admin_keyboard())
 
-@dp.message(F.text == "✅ Вкл. автопост", lambda message: is_admin(message.from_user.id))
 async def enable_posting(message: types.Message):
     global posting_enabled
     if not posting_enabled:
@@ -623,7 +850,6 @@ async def enable_posting(message: types.Message):
     else:
         await message.answer("ℹ️ Автопостинг уже включен", reply_markup=get_admin_keyboard())
 
-@dp.message(F.text == "🔄 Статус", lambda message: is_admin(message.from_user.id))
 async def post_status(message: types.Message):
     global post_time
     next_post_time = datetime.now(pytz.timezone('Europe/Moscow')).replace(hour=post_time.hour, minute=post_time.minute, second=0, microsecond=0)
@@ -637,15 +863,13 @@ async def post_status(message: types.Message):
         reply_markup=get_admin_keyboard()
     )
 
-@dp.message(F.text == "⏰ Изменить время", lambda message: is_admin(message.from_user.id))
 async def cmd_set_time(message: types.Message, state: FSMContext):
     await message.answer(
         "⏰ Введите новое время публикации в формате ЧЧ:ММ (например, 20:00):",
-        reply_markup=types.ReplyKeyboardRemove()
+        reply_markup=get_remove_keyboard()
     )
-    await state.set_state(PostStates.waiting_for_time)
+    await state.set_state(get_post_states().waiting_for_time)
 
-@dp.message(PostStates.waiting_for_time, lambda message: is_admin(message.from_user.id))
 async def process_set_time(message: types.Message, state: FSMContext):
     global post_time, schedule_task
     
@@ -677,10 +901,38 @@ async def process_set_time(message: types.Message, state: FSMContext):
     except ValueError:
         await message.answer("❌ Неверное время. Используйте формат ЧЧ:ММ (например, 20:00)")
 
+async def cmd_search(message: types.Message, command: CommandObject):
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔍 Использование: /search <запрос>")
+        return
+    
+    started = datetime.now()
+    results = await asyncio.to_thread(get_search_index().search, query, limit=10)
+    elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+    
+    if not results:
+        await message.answer(f"🔍 Ничего не найдено ({elapsed_ms:.0f} мс)")
+        return
+    
+    lines = [f"🔍 Найдено {len(results)} ({elapsed_ms:.0f} мс):"]
+    for r in results:
+        kind = "📢 Пост" if r['is_post'] else "💬 Комментарий"
+        lines.append(f"\n{kind} ID {r['id']} (telegram_id: {r['telegram_id']})\n{r['snippet']}")
+    await message.answer("\n".join(lines), disable_web_page_preview=True)
+
+async def cmd_reindex(message: types.Message):
+    await message.answer("🔄 Перестраиваю поисковый индекс...")
+    added = await rebuild_search_index()
+    if added is None:
+        await message.answer("❌ Не удалось перестроить поисковый индекс", reply_markup=get_admin_keyboard())
+    else:
+        await message.answer(f"✅ Поисковый индекс перестроен: {added} сообщений", reply_markup=get_admin_keyboard())
+
 async def on_startup():
     for admin_id in ADMINS:
         try:
-            await bot.send_message(
+            await get_bot().send_message(
                 chat_id=admin_id,
                 text=f"🤖 Бот запущен и готов к работе!\n"
                      f"Текущее время публикации: {post_time.strftime('%H:%M')} МСК",
@@ -689,14 +941,61 @@ async def on_startup():
         except Exception as e:
             logger.error(f"Не удалось отправить сообщение админу {admin_id}: {e}")
 
-@dp.message()
 async def unhandled_message(message: types.Message):
     logger.warning(f"Необработанное сообщение: {message.text}")
 
+def create_dispatcher() -> Dispatcher:
+    """Создает диспетчер и регистрирует обработчики"""
+    from aiogram import Dispatcher, F
+    from aiogram.filters import Command
+
+    states = get_post_states()
+    admin = lambda message: is_admin(message.from_user.id)
+    
+    dispatcher = Dispatcher()
+    dispatcher.message.register(cmd_start, Command("start"))
+    dispatcher.message.register(cmd_help, F.text == "ℹ️ Помощь", admin)
+    dispatcher.message.register(manual_post, F.text == "📝 Создать пост")
+    dispatcher.message.register(approve_post, F.text == "✅ Опубликовать", admin)
+    dispatcher.message.register(regenerate_post, F.text == "🔄 Перегенерировать", admin)
+    dispatcher.message.register(edit_post_manually, F.text == "✏️ Редактировать", admin)
+    dispatcher.message.register(add_media_to_post, F.text == "📷 Добавить медиа", admin)
+    dispatcher.message.register(cancel_post, F.text == "🚫 Отменить", admin)
+    dispatcher.message.register(postpone_post, F.text == "⏱ Отложить", admin)
+    dispatcher.message.register(process_media, states.waiting_for_media, F.photo | F.video, admin)
+    dispatcher.message.register(finish_adding_media, states.waiting_for_media, Command("done"), admin)
+    dispatcher.message.register(cancel_post, F.text == "❌ Отменить публикацию", admin)
+    dispatcher.message.register(disable_posting, F.text == "⛔ Выкл. автопост", admin)
+    dispatcher.message.register(enable_posting, F.text == "✅ Вкл. автопост", admin)
+    dispatcher.message.register(post_status, F.text == "🔄 Статус", admin)
+    dispatcher.message.register(cmd_set_time, F.text == "⏰ Изменить время", admin)
+    dispatcher.message.register(process_set_time, states.waiting_for_time, admin)
+    dispatcher.message.register(cmd_search, Command("search"), admin)
+    dispatcher.message.register(cmd_reindex, Command("reindex"), admin)
+    dispatcher.message.register(
+        on_discussion_forward,
+        F.is_automatic_forward,
+        lambda message: message.chat.id == linked_chat_id
+    )
+    dispatcher.message.register(unhandled_message)
+    return dispatcher
+
+def create_app():
+    """Фабрика приложения: создает бота и диспетчер с обработчиками"""
+    global dp
+    if dp is None:
+        dp = create_dispatcher()
+    return get_bot(), dp
+
 async def main():
     global schedule_task
     logger.info("Запуск бота...")
-    await on_startup()
+    bot, dp = create_app()
+    # Кешируем ID чата комментариев, чтобы не запрашивать его при каждой публикации
+    await asyncio.gather(on_startup(), get_linked_chat_id())
+    # Пустой индекс (первый запуск или новая машина) заполняем из Supabase в фоне
+    if await asyncio.to_thread(get_search_index().count) == 0:
+        run_in_background(rebuild_search_index())
     schedule_task = asyncio.create_task(schedule_post())
     await dp.start_polling(bot)
 
@@ -0,0 +1,264 @@
+"""Локальный полнотекстовый индекс опубликованных постов и комментариев (SQLite FTS5)."""
+from typing import Optional, Dict, List, Iterable
+from urllib.parse import urlsplit
+import threading
+import sqlite3
+import json
+import os
+import re
+
+# Слова короче этого не учитываются при поиске уже освещенных тем
+MIN_TERM_LENGTH = 4
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Служебные и типовые для новостных заголовков слова: по ним темы не различить
+STOPWORDS = frozenset("""
+about after again also amid back been before being best could does down from have here into just
+like make makes many more most much next only other over says said some than that their them then
+there these they this those through under until very want wants were what when where which while
+will with would your year years week today first gets takes here's
+raise raises raised raising launch launches launched unveils unveiled announces announced adds
+acquires acquired buys plans hires startup startups company companies funding round series
+million billion valuation deal report reportedly update updates news
+""".split())
+# Слово из адресов источников считается общим, если встречается чаще, чем в этой доле адресов
+COMMON_TERM_SHARE = 0.02
+COMMON_TERM_MIN_DOCS = 20
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    message_text,
+    telegram_id UNINDEXED,
+    is_post UNINDEXED,
+    url UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS post_urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    UNIQUE (url, message_id)
+);
+CREATE INDEX IF NOT EXISTS post_urls_message_id ON post_urls(message_id);
+-- Слова из адреса каждого источника (rowid = post_urls.id): посты русские, а заголовки
+-- статей английские, зато адрес статьи TechCrunch повторяет ее заголовок
+CREATE VIRTUAL TABLE IF NOT EXISTS post_topics USING fts5(
+    words,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+-- Число адресов с каждым словом: частые слова не считаются совпадением темы
+CREATE VIRTUAL TABLE IF NOT EXISTS post_topics_vocab USING fts5vocab(post_topics, row);
+"""
+
+
+def parse_urls(url: Optional[str]) -> List[str]:
+    """Поле url хранит JSON-список ссылок или одну ссылку"""
+    if not url:
+        return []
+    try:
+        urls = json.loads(url)
+    except ValueError:
+        return [url]
+    if isinstance(urls, str):
+        return [urls]
+    return [u for u in urls if isinstance(u, str)] if isinstance(urls, list) else []
+
+
+def terms(text: str) -> List[str]:
+    """Значимые слова текста в нижнем регистре, без повторов"""
+    seen = []
+    for word in _WORD_RE.findall(text.lower()):
+        if len(word) >= MIN_TERM_LENGTH and not word.isdigit() and word not in seen:
+            seen.append(word)
+    return seen
+
+
+def url_terms(url: str) -> List[str]:
+    """Значимые слова из пути ссылки (slug статьи повторяет ее заголовок)"""
+    return terms(urlsplit(url).path)
+
+
+def quote(term: str) -> str:
+    """Экранирует слово как строку запроса FTS5"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """Индекс таблицы messages: пополняется при вставках и перестраивается целиком."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Вызовы идут из потоков asyncio.to_thread, поэтому доступ к соединению сериализуется
+        self.lock = threading.Lock()
+        # Перестройка держит не self.lock, а свою блокировку: новый индекс строится отдельно
+        self.rebuild_lock = threading.Lock()
+        # Записи, добавленные во время перестройки; применяются к новому индексу после подмены
+        self.pending: Optional[List[Dict]] = None
+        self.conn = self._connect(path)
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM messages_fts").fetchone()[0]
+
+    @staticmethod
+    def _add(conn: sqlite3.Connection, row: Dict, replace: bool = True):
+        message_id = row["id"]
+        if replace:
+            conn.execute("DELETE FROM messages_fts WHERE rowid = ?", (message_id,))
+            conn.execute(
+                "DELETE FROM post_topics WHERE rowid IN (SELECT id FROM post_urls WHERE message_id = ?)",
+                (message_id,)
+            )
+            conn.execute("DELETE FROM post_urls WHERE message_id = ?", (message_id,))
+        conn.execute(
+            "INSERT INTO messages_fts(rowid, message_text, telegram_id, is_post, url) VALUES (?, ?, ?, ?, ?)",
+            (message_id, row.get("message_text") or "", row.get("telegram_id"),
+             int(bool(row.get("is_post"))), row.get("url"))
+        )
+        for url in parse_urls(row.get("url")):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO post_urls(url, message_id) VALUES (?, ?)", (url, message_id)
+            )
+            words = url_terms(url)
+            if cursor.rowcount and words:
+                conn.execute(
+                    "INSERT INTO post_topics(rowid, words) VALUES (?, ?)", (cursor.lastrowid, " ".join(words))
+                )
+
+    def add(self, row: Dict):
+        """Добавляет или обновляет одну запись messages"""
+        if not row or row.get("id") is None:
+            return
+        with self.lock, self.conn:
+            self._add(self.conn, row)
+            if self.pending is not None:
+                self.pending.append(row)
+
+    def rebuild(self, rows: Iterable[Dict]) -> int:
+        """Перестраивает индекс целиком из выгрузки messages.
+
+        Новый индекс строится в отдельном соединении (для файла — во временном
+        файле рядом), а self.lock берется только на подмену соединения, так что
+        поиск и добавление записей во время перестройки не ждут ее окончания.
+        Записи новее выгрузки и добавленные во время перестройки переносятся
+        в новый индекс перед подменой.
+        """
+        with self.rebuild_lock:
+            with self.lock:
+                self.pending = []
+            in_memory = self.path == ":memory:"
+            target = self.path if in_memory else self.path + ".rebuild"
+            if not in_memory and os.path.exists(target):
+                os.remove(target)
+
+            conn = self._connect(target)
+            added = 0
+            last_id = None
+            try:
+                with conn:
+                    for row in rows:
+                        if row.get("id") is not None:
+                            self._add(conn, row, replace=False)
+                            added += 1
+                            last_id = row["id"] if last_id is None else max(last_id, row["id"])
+                conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+                conn.execute("INSERT INTO post_topics(post_topics) VALUES ('optimize')")
+                conn.commit()
+
+                # Сообщения, вставленные между выгрузкой и началом перестройки, есть только в старом индексе;
+                # переносим их и накопленные за перестройку записи до подмены, не держа self.lock
+                with self.lock:
+                    newer = [
+                        {"id": r[0], "message_text": r[1], "telegram_id": r[2], "is_post": r[3], "url": r[4]}
+                        for r in self.conn.execute(
+                            "SELECT rowid, message_text, telegram_id, is_post, url FROM messages_fts WHERE rowid > ?",
+                            (last_id if last_id is not None else -1,)
+                        )
+                    ]
+                    pending, self.pending = self.pending, []
+                with conn:
+                    for row in newer + pending:
+                        self._add(conn, row)
+            except BaseException:
+                with self.lock:
+                    self.pending = None
+                conn.close()
+                if not in_memory and os.path.exists(target):
+                    os.remove(target)
+                raise
+
+            with self.lock:
+                pending, self.pending = self.pending, None
+                self.conn.close()
+                if not in_memory:
+                    conn.close()
+                    os.replace(target, self.path)
+                    conn = self._connect(self.path)
+                with conn:
+                    for row in pending:
+                        self._add(conn, row)
+                self.conn = conn
+            return added
+
+    def search(self, query: str, limit: int = 10, posts_only: bool = False) -> List[Dict]:
+        """Ищет записи, содержащие все слова запроса; лучшие совпадения первыми"""
+        words = _WORD_RE.findall(query)
+        if not words:
+            return []
+        sql = (
+            "SELECT rowid, telegram_id, is_post, url, "
+            "snippet(messages_fts, 0, '«', '»', '…', 12) "
+            "FROM messages_fts WHERE messages_fts MATCH ?"
+            + (" AND is_post = 1" if posts_only else "") +
+            " ORDER BY rank LIMIT ?"
+        )
+        with self.lock:
+            rows = self.conn.execute(sql, (" ".join(quote(w) for w in words), limit)).fetchall()
+        return [
+            {"id": r[0], "telegram_id": r[1], "is_post": bool(r[2]), "url": r[3], "snippet": r[4]}
+            for r in rows
+        ]
+
+    def find_covered(self, url: str, title: str, min_overlap: float = 0.5) -> Optional[int]:
+        """ID поста, в котором уже была эта статья (по ссылке) или ее тема.
+
+        Тема сравнивается по словам заголовка и словам из адреса каждого источника поста.
+        Учитываются только отличительные слова: без служебных и без слов, которые есть
+        во многих адресах; совпасть должны хотя бы два таких слова.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT message_id FROM post_urls WHERE url = ? LIMIT 1", (url,)
+            ).fetchone()
+            if row:
+                return row[0]
+
+            title_terms = [t for t in terms(title) if t not in STOPWORDS]
+            if len(title_terms) < 2:
+                return None
+            sources = self.conn.execute("SELECT count(*) FROM post_urls").fetchone()[0]
+            common_limit = max(COMMON_TERM_MIN_DOCS, sources * COMMON_TERM_SHARE)
+            doc_counts = dict(self.conn.execute(
+                f"SELECT term, doc FROM post_topics_vocab WHERE term IN ({','.join('?' * len(title_terms))})",
+                title_terms
+            ).fetchall())
+            title_terms = [t for t in title_terms if doc_counts.get(t, 0) <= common_limit]
+            if len(title_terms) < 2:
+                return None
+            candidates = self.conn.execute(
+                "SELECT u.message_id, t.words FROM post_topics t JOIN post_urls u ON u.id = t.rowid "
+                "WHERE post_topics MATCH ? ORDER BY t.rank LIMIT 5",
+                (" OR ".join(quote(t) for t in title_terms),)
+            ).fetchall()
+
+        needed = max(2, round(len(title_terms) * min_overlap))
+        for message_id, words in candidates:
+            post_terms = set(words.split())
+            if sum(t in post_terms for t in title_terms) >= needed:
+                return message_id
+        return None
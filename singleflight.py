@@ -0,0 +1,50 @@
+"""Single-flight: одновременные вызовы с одним ключом разделяют одно выполнение."""
+from typing import Optional, Dict, Callable, Awaitable, Any
+import asyncio
+
+
+class _Flight:
+    __slots__ = ("task", "force_new")
+
+    def __init__(self, task: asyncio.Task, force_new: bool):
+        self.task = task
+        self.force_new = force_new
+
+
+class SingleFlight:
+    """Объединяет конкурентные вызовы по ключу в одно выполнение.
+
+    Обычный вызов присоединяется к уже идущему выполнению. Вызов с force_new=True
+    присоединяется только к выполнению, которое тоже запущено с force_new, иначе
+    запускает новое — после завершения текущего, чтобы они не гонялись за общее
+    состояние.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def joins(self, key: str, force_new: bool = False) -> bool:
+        """Присоединится ли вызов do(key, ..., force_new) к идущему выполнению"""
+        flight = self._flights.get(key)
+        return bool(flight and (flight.force_new or not force_new))
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], force_new: bool = False) -> Any:
+        flight = self._flights.get(key)
+        if self.joins(key, force_new):
+            # Отмена одного из ожидающих не должна отменять общее выполнение
+            return await asyncio.shield(flight.task)
+
+        previous = flight.task if flight else None
+        task = asyncio.create_task(self._run(key, fn, previous))
+        self._flights[key] = _Flight(task, force_new)
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]], previous: Optional[asyncio.Task]) -> Any:
+        try:
+            if previous:
+                await asyncio.wait({previous})
+            return await fn()
+        finally:
+            flight = self._flights.get(key)
+            if flight and flight.task is asyncio.current_task():
+                del self._flights[key]
@@ -0,0 +1,162 @@
+"""Трассировка генерации постов: спаны внутри одного прогона с общим run id."""
+from typing import Optional, Dict, List, Callable, Awaitable
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import logging
+import json
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_current_run: ContextVar[Optional["RunTrace"]] = ContextVar("current_run", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """Отрезок работы внутри прогона: время начала/конца и атрибуты"""
+
+    def __init__(self, span_id: int, name: str, parent_id: Optional[int], attrs: Dict):
+        self.span_id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+
+class _NoopSpan:
+    """Заглушка для кода, вызванного вне прогона"""
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class RunTrace:
+    """Все спаны одного прогона генерации поста"""
+
+    def __init__(self, name: str):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started_at = datetime.now().astimezone()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.spans: List[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self) -> Dict:
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(self.duration, 4),
+            "error": self.error,
+            "spans": [
+                {
+                    "id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "name": s.name,
+                    "offset": round(s.start - self.start, 4),
+                    "duration": round((s.end or s.start) - s.start, 4),
+                    "error": s.error,
+                    **({"attrs": s.attrs} if s.attrs else {}),
+                }
+                for s in self.spans
+            ],
+        }
+
+    def waterfall(self, width: int = 16, max_lines: int = 25) -> str:
+        """Компактная текстовая диаграмма спанов для отправки в Telegram"""
+        total = self.duration or 1e-9
+        depths: Dict[int, int] = {}
+        lines = [f"{self.name} · run {self.run_id} · {self.duration:.1f} с"]
+
+        for s in self.spans[:max_lines]:
+            depth = depths[s.parent_id] + 1 if s.parent_id in depths else 0
+            depths[s.span_id] = depth
+            offset = s.start - self.start
+            duration = (s.end or s.start) - s.start
+            begin = min(width - 1, int(offset / total * width))
+            length = max(1, round(duration / total * width))
+            bar = "·" * begin + "█" * min(length, width - begin)
+            bar = bar.ljust(width, "·")
+            mark = " ❌" if s.error else ""
+            retries = f" ×{s.attrs['attempts']}" if s.attrs.get("attempts", 1) > 1 else ""
+            lines.append(f"{bar} {duration:6.2f}с {'  ' * depth}{s.name}{retries}{mark}")
+
+        if len(self.spans) > max_lines:
+            lines.append(f"… ещё {len(self.spans) - max_lines} спанов")
+        return "\n".join(lines)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Открывает спан в текущем прогоне; вне прогона ничего не записывает"""
+    run = _current_run.get()
+    if run is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(len(run.spans) + 1, name, parent.span_id if parent else None, attrs)
+    run.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def write_trace(run: RunTrace, path: str):
+    """Дописывает трассу прогона в JSONL-файл"""
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run.to_dict(), ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.error(f"Не удалось записать трассу {run.run_id}: {e}")
+
+
+@asynccontextmanager
+async def trace_run(
+    name: str,
+    path: str,
+    slow_threshold: Optional[float] = None,
+    on_slow: Optional[Callable[[RunTrace], Awaitable[None]]] = None
+):
+    """Прогон генерации: собирает спаны, пишет трассу и сообщает о медленных прогонах"""
+    run = RunTrace(name)
+    run_token = _current_run.set(run)
+    span_token = _current_span.set(None)
+    try:
+        yield run
+    except BaseException as e:
+        run.error = repr(e)
+        raise
+    finally:
+        run.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_run.reset(run_token)
+        write_trace(run, path)
+        logger.info(f"Прогон {name} ({run.run_id}) занял {run.duration:.2f} с")
+
+        if on_slow and slow_threshold is not None and run.duration > slow_threshold:
+            try:
+                await on_slow(run)
+            except Exception as e:
+                logger.error(f"Не удалось отправить отчет о медленном прогоне {run.run_id}: {e}")